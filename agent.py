@@ -1,25 +1,99 @@
+import time
 import logging
 from llm_interface import LLaMAModel
 from amazon_authenticator import AmazonAuthenticator
 from amazon_order_fetcher import AmazonOrderFetcher
+from order_index import OrderIndex
+from order_sink import StreamingOrderSink
+from metrics import metrics
+from session_store import SessionStore
+
+# Default for optional stores, so that passing None can switch them off
+DEFAULT = object()
 
 
 class Agent:
-    def __init__(self, llm_model):
-        self.llm_model = LLaMAModel()
-        self.authenticator = AmazonAuthenticator(llm_model)
-        self.authenticator.init_driver()
-        self.authenticator.login()
-        self.order_fetcher = AmazonOrderFetcher(self.authenticator.get_driver())
+    def __init__(self, llm_model=None, concurrency=1, order_index=None, sink=None, export_per_file=False, summary_mode=False, include_items=False, session_store=DEFAULT, http_detail_pages=False, email=None, password=None, order_store=DEFAULT):
         logging.basicConfig(filename='amazon_order_agent.log', level=logging.INFO, 
                             format='%(asctime)s - %(levelname)s - %(message)s')
+        start = time.perf_counter()
+        # One model instance shared by the authenticator and the fetcher
+        self.llm_model = llm_model or LLaMAModel()
+        # None disables session persistence; only the default picks a store
+        if session_store is DEFAULT:
+            session_store = self._default_session_store()
+        self.authenticator = AmazonAuthenticator(self.llm_model, session_store=session_store, email=email, password=password)
+        self.authenticator.init_driver()
+        driver_ready = time.perf_counter()
+        try:
+            self.session_restored = self.authenticator.ensure_logged_in()
+        except Exception:
+            # Nobody else holds the driver yet; don't leave the browser running
+            self.authenticator.close_driver()
+            raise
+        self.order_fetcher = AmazonOrderFetcher(
+            self.authenticator.get_driver(),
+            llm_model=self.llm_model,
+            driver_factory=self.authenticator.create_driver,
+            concurrency=concurrency,
+            order_index=order_index or OrderIndex(),
+            sink=sink or StreamingOrderSink(),
+            export_per_file=export_per_file,
+            summary_mode=summary_mode,
+            include_items=include_items,
+            http_detail_pages=http_detail_pages
+        )
+        self.order_store = self._default_order_store() if order_store is DEFAULT else order_store
+        self.start_time = start
+        self.time_to_first_order = None
+        self.cold_start_seconds = time.perf_counter() - start
+        logging.info(
+            f"Agent cold start took {self.cold_start_seconds:.2f}s "
+            f"(driver {driver_ready - start:.2f}s, {'session restore' if self.session_restored else 'login'} {self.cold_start_seconds - (driver_ready - start):.2f}s)"
+        )
+
+    @staticmethod
+    def _default_session_store():
+        try:
+            return SessionStore()
+        except ValueError as e:
+            logging.warning(f"{e}; logging in on every run")
+            return None
+
+    @staticmethod
+    def _default_order_store():
+        try:
+            # pyarrow is heavy; load it only when the analytics store is used
+            from order_store import OrderStore
+            return OrderStore()
+        except ValueError as e:
+            logging.warning(f"{e}; orders are not added to the analytics store")
+            return None
+
+    def report_time_to_first_order(self):
+        first_order_at = self.order_fetcher.first_order_at
+        if first_order_at is None:
+            return None
+        seconds = first_order_at - self.start_time
+        session = "restored" if self.session_restored else "login"
+        metrics.observe("time_to_first_order_seconds", seconds, session=session)
+        logging.info(f"Time to first order: {seconds:.2f}s ({session})")
+        print(f"Time to first order: {seconds:.2f}s")
+        return seconds
 
     def fetch_order_details(self):
         try:  
             orders = self.order_fetcher.fetch_orders()
+            self.time_to_first_order = self.report_time_to_first_order()
+            if orders and self.order_store is not None:
+                self.order_store.add(orders)
             if orders:
                 print("Orders fetched and saved successfully!")
             else:
-                print("No orders found in history")
+                print("No new orders found in history")
         finally:
+            self.order_fetcher.close()
+            self.order_fetcher.sink.close()
+            if self.order_store is not None:
+                self.order_store.close()
             self.authenticator.close_driver()
\ No newline at end of file
@@ -1,33 +1,45 @@
-import time
 import os
+import time
+import logging
 from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
-from browser_automation_interface import SeleniumAdapter
+from browser_automation_interface import SeleniumAdapter, SIGNIN_PATH
 from llm_interface import LLaMAModel
+from metrics import metrics
+
+AMAZON_URL = "https://www.amazon.com"
+ORDER_HISTORY_URL = "https://www.amazon.com/gp/css/order-history"
 
 
 class AmazonAuthenticator:
-    def __init__(self, llm_model: LLaMAModel):
-        self.email = os.environ.get('AMAZON_EMAIL')
-        self.password = os.environ.get('AMAZON_PASSWORD')
+    def __init__(self, llm_model: LLaMAModel, session_store=None, email=None, password=None):
+        # Explicit credentials (one per account in batch runs) win over the environment
+        self.email = email or os.environ.get('AMAZON_EMAIL')
+        self.password = password or os.environ.get('AMAZON_PASSWORD')
         self.driver = None
         self.llm_model = llm_model
+        # Optional SessionStore; with one, logins are saved and reused across runs
+        self.session_store = session_store
 
     def init_driver(self):
+        self.driver = self.create_driver()
+
+    def create_driver(self):
         chrome_options = Options()
         chrome_options.add_argument("--headless")  # Run headless for automation
-        self.driver = SeleniumAdapter(webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options))
+        return SeleniumAdapter(webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options))
         
+    @metrics.timed("stage_seconds", stage="login")
     def login(self):
         if not self.email or not self.password:
-            raise ValueError("Amazon username and password must be set as environment variables")
+            raise ValueError("Amazon username and password must be passed in or set as environment variables")
         # self.driver.get("https://www.amazon.com/ap/signin")
         try:
             self.driver.navigate_to("https://www.amazon.com/ap/signin?openid.pape.max_auth_age=900&openid.return_to=https%3A%2F%2Fwww.amazon.com%3Fpd_rd_w%3DPPDJf%26content-id%3Damzn1.sym.80f55c46-3037-42ea-9b77-ed938babf4c3%3Aamzn1.sym.80f55c46-3037-42ea-9b77-ed938babf4c3%26pf_rd_p%3D80f55c46-3037-42ea-9b77-ed938babf4c3%26pf_rd_r%3D99F6MEPQCWMQNJNGQSR4%26pd_rd_wg%3DgqVUc%26pd_rd_r%3D405e8053-f439-45a9-b7fa-4f9dd4c2981d%26qid%3D1715897200%26ref%3Dsxts_aspa_qna%26c_c%3D-802937953&openid.assoc_handle=usflex&openid.mode=checkid_setup&openid.ns=http%3A%2F%2Fspecs.openid.net%2Fauth%2F2.0")
-            time.sleep(2)
+            self.driver.wait_for_page_ready()
         except NoSuchElementException:
             print("Error: Login elements not found.")
             raise
@@ -40,9 +52,7 @@ class AmazonAuthenticator:
         # Use LLM to find the "Continue" button element
         continue_button_prompt= "Find the button that says 'Continue' on the Amazon sign-in page."
         continue_button = self.llm_model.find_element_by_description(continue_button_prompt, self.driver)
-        continue_button.click()
-
-        time.sleep(2)
+        self.driver.click_and_wait(continue_button)
 
         # Use LLM to find the password field element
         password_field_prompt = "Find the input field where you enter your password on the Amazon sign-in page."
@@ -52,15 +62,79 @@ class AmazonAuthenticator:
         # Use LLM to find the "Sign In" button element
         signin_button_prompt = "Find the button that says 'Sign In' on the Amazon sign-in page."
         signin_button = self.llm_model.find_element_by_description(signin_button_prompt, self.driver)
-        signin_button.click()
-        
-        time.sleep(2)
+        self.driver.click_and_wait(signin_button)
         
         # Check if login was successful
         if "Your Account" in self.driver.get_page_source():
             print("Login successful")
         else:
             raise Exception("Login failed")
+        if self.session_store:
+            self.save_session()
+
+    def ensure_logged_in(self):
+        """Restores the saved session if Amazon still accepts it, otherwise logs in.
+
+        Returns True when a saved session was reused.
+        """
+        if self.restore_session():
+            print("Restored saved session")
+            return True
+        self.login()
+        return False
+
+    def save_session(self):
+        self.session_store.save({
+            "cookies": self.driver.get_cookies(),
+            "local_storage": self.driver.get_storage("localStorage"),
+            "session_storage": self.driver.get_storage("sessionStorage"),
+        })
+        logging.info("Saved authenticated session")
+
+    @metrics.timed("stage_seconds", stage="restore_session")
+    def restore_session(self):
+        """Loads saved cookies and storage into the browser and checks that they still sign us in."""
+        state = self.session_store.load() if self.session_store else None
+        if not state:
+            return False
+        # Cookies and storage can only be set for the origin the browser is on
+        self.driver.navigate_to(AMAZON_URL)
+        self.driver.wait_for_page_ready()
+        now = time.time()
+        for cookie in state["cookies"]:
+            if cookie.get("expiry") and cookie["expiry"] < now:
+                continue
+            try:
+                self.driver.add_cookie(cookie)
+            except WebDriverException as e:
+                logging.debug(f"Skipping cookie {cookie.get('name')}: {e}")
+        self.driver.set_storage(state.get("local_storage") or {}, "localStorage")
+        self.driver.set_storage(state.get("session_storage") or {}, "sessionStorage")
+        if self.is_logged_in():
+            logging.info("Restored saved session")
+            return True
+        logging.info("Saved session was rejected; logging in again")
+        self.session_store.clear()
+        self.clear_session()
+        return False
+
+    def clear_session(self):
+        """Drops cookies and storage so a fresh login doesn't start with a stale session."""
+        self.driver.delete_all_cookies()
+        # Storage is per origin: clear it on amazon.com, where restore_session put it
+        self.driver.navigate_to(AMAZON_URL)
+        self.driver.wait_for_page_ready()
+        self.driver.clear_storage("localStorage")
+        self.driver.clear_storage("sessionStorage")
+
+    def is_logged_in(self):
+        """One page load: signed-out visitors of the order history are redirected to sign-in.
+
+        On success the browser is left on the order history page.
+        """
+        self.driver.navigate_to(ORDER_HISTORY_URL)
+        self.driver.wait_for_page_ready()
+        return SIGNIN_PATH not in self.driver.get_current_url()
 
     def get_driver(self):
         return self.driver
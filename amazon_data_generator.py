@@ -1,27 +1,192 @@
-import random
+import os
+import sys
 import json
+import random
+import logging
+import argparse
+
+# Placeholder for a field the page does not show; templates leave such fields out
+MISSING = "N/A"
+
+PAGE_NOISE_MARKUP = [
+    '<script type="text/javascript">window.ue_t0=window.ue_t0||+new Date();</script>',
+    '<style>.a-box{border-radius:8px}.nav-sprite{background-image:url(nav-sprite.png)}</style>',
+    '<div id="nav-belt"><a href="/gp/help/customer/display.html">Help</a><a href="/gp/cart/view.html">Cart</a></div>',
+    '<div class="a-section a-spacing-none"><span class="a-declarative" data-action="a-popover">Track package</span></div>',
+    '<!-- sp:feature:nav-footer -->',
+]
+
+
+def _present(order_data, field):
+    return order_data.get(field, MISSING) != MISSING
+
+
+def render_spans_template(order_data):
+    parts = ['<div id="orderDetails">']
+    for field, label in (("order_id", "Order ID"), ("order_date", "Order placed"), ("order_total", "Total")):
+        if _present(order_data, field):
+            parts.append(
+                f"""
+                        <span class="a-color-secondary" data-a-popover='{{"header": "{label}"}}'>{label}:</span> {order_data[field]}"""
+            )
+    if _present(order_data, "shipping_address"):
+        parts.append(f"""
+                        <div id="shippingAddressWidget">
+                            <span class="displayAddressFullName">John Doe</span>
+                            <li class="displayAddressLI"><span>{order_data['shipping_address']}</span></li>
+                        </div>""")
+    if _present(order_data, "delivery_status"):
+        parts.append(f"""
+                        <div id="deliveryStatusBarWidget-container">
+                            <div class="a-row">{order_data['delivery_status']}</div>
+                        </div>""")
+    parts.append("""
+                        <div id="ordersInPackage-container">""")
+    for item in order_data["items"]:
+        parts.append(f"""
+                            <div class="a-fixed-left-grid-inner">
+                                <a class="a-link-normal">{item["name"]}</a>
+                                <span class="item-view-qty">Qty: {item["quantity"]}</span>
+                                <span class="a-offscreen">{item["price"]}</span>
+                            </div>""")
+    parts.append("""</div>  </div>""")
+    return "".join(parts)
+
+
+def render_section_template(order_data):
+    # Different class names and structure
+    parts = ['<div class="order-details-section">']
+    if _present(order_data, "order_id"):
+        parts.append(f"\n                        <h2>Order {order_data['order_id']}</h2>")
+    if _present(order_data, "order_date"):
+        parts.append(f"\n                        <p>Placed on {order_data['order_date']}</p>")
+    if _present(order_data, "order_total"):
+        parts.append(f"\n                        <p>Total: {order_data['order_total']}</p>")
+    if _present(order_data, "shipping_address"):
+        parts.append(f"\n                        <h3>Shipping Address:</h3>\n                        <p>{order_data['shipping_address']}</p>")
+    if _present(order_data, "delivery_status"):
+        parts.append(f"\n                        <h3>Delivery Status:</h3>\n                        <p>{order_data['delivery_status']}</p>")
+    parts.append("\n                        <h3>Items:</h3>\n                        <ul>")
+    for item in order_data["items"]:
+        parts.append(f"""<li>{item['name']} (Qty: {item['quantity']}, Price: {item['price']})</li>""")
+    parts.append("</ul></div>")
+    return "".join(parts)
+
+
+def render_table_template(order_data):
+    # Table layout
+    parts = ['<div id="orderDetailsTable">\n                        <table>']
+    for field, label in (
+        ("order_id", "Order ID"),
+        ("order_date", "Order Placed"),
+        ("order_total", "Total"),
+        ("shipping_address", "Shipping Address"),
+        ("delivery_status", "Delivery Status"),
+    ):
+        if _present(order_data, field):
+            parts.append(f"\n                            <tr><th>{label}:</th><td>{order_data[field]}</td></tr>")
+    parts.append('\n                            <tr><th colspan="2">Items:</th></tr>')
+    for item in order_data["items"]:
+        parts.append(f"""<tr><td>{item['name']}</td><td>Qty: {item['quantity']}, Price: {item['price']}</td></tr>""")
+    parts.append("""</table></div>""")
+    return "".join(parts)
+
+
+def extra_markup_noise(html, rng):
+    """HTML noise: surrounds the snippet with unrelated page chrome."""
+    before = rng.sample(PAGE_NOISE_MARKUP, rng.randint(1, 2))
+    after = rng.sample(PAGE_NOISE_MARKUP, rng.randint(0, 2))
+    return "".join(before) + html + "".join(after)
+
+
+def missing_field_noise(order_data, rng):
+    """Order noise: hides one optional field from the page (and marks it missing in the target)."""
+    order_data[rng.choice(["shipping_address", "delivery_status"])] = MISSING
+    return order_data
+
+
+# Layout variations keyed by the `template_variation` accepted by generate_html_snippet
+TEMPLATES = {
+    1: render_spans_template,
+    2: render_section_template,
+    3: render_table_template,
+}
+
+# Built-in noise functions and the stage they run at: "order" before rendering, "html" after
+NOISE = {
+    "extra_markup": ("html", extra_markup_noise),
+    "missing_field": ("order", missing_field_noise),
+}
+
 
 class AmazonOrderDataGenerator:
-    def __init__(self):
+    """Synthetic order pages paired with the JSON an extractor should return.
+
+    All randomness comes from `seed`, so a seed reproduces a dataset exactly.
+    `iter_examples` streams rows with field values drawn in vectorized
+    chunks; `write_parquet_shards` generates shards in parallel processes.
+    Layouts are added with `register_template` and perturbations with
+    `add_noise`, without changing the generation loop.
+    """
+
+    def __init__(self, seed=None):
         self.product_names = [
             "Laptop", "Headphones", "Book", "Coffee Maker", "Phone Charger",
             "Table", "Chair", "Shoes", "Trousers", "Shirts", "Cupboard"
         ]
         self.order_statuses = ["Shipped", "Delivered", "Pending", "Canceled"]
+        self.templates = dict(TEMPLATES)
+        # name -> (stage, function, probability)
+        self.noise = {}
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self._np_rng = None
+
+    @property
+    def np_rng(self):
+        if self._np_rng is None:
+            import numpy as np
+            self._np_rng = np.random.default_rng(self.seed)
+        return self._np_rng
+
+    def reseed(self, seed):
+        """Restarts both random streams; `seed` may be an int or a numpy SeedSequence."""
+        import numpy as np
+        self._np_rng = np.random.default_rng(seed)
+        self.rng = random.Random(int(self._np_rng.integers(2 ** 63)))
+
+    def register_template(self, variation, render):
+        """Adds a layout; `render(order_data)` returns the HTML snippet."""
+        self.templates[variation] = render
+
+    def add_noise(self, name, probability, function=None, stage=None):
+        """Applies a noise function to a `probability` share of examples.
+
+        Built-in noise is selected by name alone. Custom "order" functions
+        take and return the order dict before rendering; "html" functions take
+        and return the snippet. Both also receive a random.Random.
+        """
+        if function is None:
+            if name not in NOISE:
+                raise ValueError(f"Unknown noise: {name}")
+            stage, function = NOISE[name]
+        if stage not in ("order", "html"):
+            raise ValueError(f"Noise stage must be 'order' or 'html', not {stage!r}")
+        self.noise[name] = (stage, function, probability)
 
     def generate_item_details(self):
-        item_name = random.choice(self.product_names)
-        quantity = random.randint(1, 5)
-        price = f"${random.uniform(10, 200):.2f}"
+        item_name = self.rng.choice(self.product_names)
+        quantity = self.rng.randint(1, 5)
+        price = f"${self.rng.uniform(10, 200):.2f}"
         return {"name": item_name, "quantity": quantity, "price": price}
 
     def generate_order_data(self):
-        order_id = f"D01-{random.randint(1000000, 9999999)}-{random.randint(1000000, 9999999)}"
-        order_date = f"{random.randint(2020, 2024)}-{random.randint(1, 12)}-{random.randint(1, 28)}"
-        order_total = f"${random.uniform(30, 500):.2f}"
+        order_id = f"D01-{self.rng.randint(1000000, 9999999)}-{self.rng.randint(1000000, 9999999)}"
+        order_date = f"{self.rng.randint(2020, 2024)}-{self.rng.randint(1, 12)}-{self.rng.randint(1, 28)}"
+        order_total = f"${self.rng.uniform(30, 500):.2f}"
         shipping_address = "123 Mavin St, Anytown, LAG, NG 12345"
-        delivery_status = random.choice(self.order_statuses)
-        items = [self.generate_item_details() for _ in range(random.randint(1, 5))]  # 1 to 5 items per order
+        delivery_status = self.rng.choice(self.order_statuses)
+        items = [self.generate_item_details() for _ in range(self.rng.randint(1, 5))]  # 1 to 5 items per order
         return {
             "order_id": order_id,
             "order_date": order_date,
@@ -31,70 +196,138 @@ class AmazonOrderDataGenerator:
             "items": items
         }
 
-    def generate_html_snippet(self, order_data, template_variation):
-        if template_variation == 1:
-            html = f"""<div id="orderDetails">
-                        <span class="a-color-secondary" data-a-popover='{{"header": "Order ID"}}'>Order ID:</span> {order_data['order_id']}
-                        <span class="a-color-secondary" data-a-popover='{{"header": "Order placed"}}'>Order placed:</span> {order_data['order_date']}
-                        <span class="a-color-secondary" data-a-popover='{{"header": "Total"}}'>Total:</span> {order_data['order_total']}
-                        <div id="shippingAddressWidget">
-                            <span class="displayAddressFullName">John Doe</span>
-                            <li class="displayAddressLI"><span>{order_data['shipping_address']}</span></li>
-                        </div>
-                        <div id="deliveryStatusBarWidget-container">
-                            <div class="a-row">{order_data['delivery_status']}</div>
-                        </div>
-                        <div id="ordersInPackage-container">"""
+    def generate_orders(self, count):
+        """Draws `count` orders at once; every field is one vectorized draw across the chunk."""
+        import numpy as np
+        np_rng = self.np_rng
+        ids = np_rng.integers(1000000, 10000000, size=(count, 2)).tolist()
+        years = np_rng.integers(2020, 2025, size=count).tolist()
+        months = np_rng.integers(1, 13, size=count).tolist()
+        days = np_rng.integers(1, 29, size=count).tolist()
+        totals = np_rng.uniform(30, 500, size=count).tolist()
+        statuses = np_rng.integers(0, len(self.order_statuses), size=count).tolist()
+        item_counts = np_rng.integers(1, 6, size=count)  # 1 to 5 items per order
+        num_items = int(item_counts.sum())
+        names = np_rng.integers(0, len(self.product_names), size=num_items).tolist()
+        quantities = np_rng.integers(1, 6, size=num_items).tolist()
+        prices = np_rng.uniform(10, 200, size=num_items).tolist()
+        offsets = np.concatenate(([0], np.cumsum(item_counts))).tolist()
 
-            for item in order_data["items"]:
-                html += f"""
-                            <div class="a-fixed-left-grid-inner">
-                                <a class="a-link-normal">{item["name"]}</a>
-                                <span class="item-view-qty">Qty: {item["quantity"]}</span>
-                                <span class="a-offscreen">{item["price"]}</span>
-                            </div>"""
-            html += """</div>  </div>"""
-        elif template_variation == 2:
-            # Template 2 (Different class names and structure)
-            html = f"""<div class="order-details-section">
-                        <h2>Order {order_data['order_id']}</h2>
-                        <p>Placed on {order_data['order_date']}</p>
-                        <p>Total: {order_data['order_total']}</p>
-                        <h3>Shipping Address:</h3>
-                        <p>{order_data['shipping_address']}</p>
-                        <h3>Delivery Status:</h3>
-                        <p>{order_data['delivery_status']}</p>
-                        <h3>Items:</h3>
-                        <ul>"""
-            for item in order_data["items"]:
-                html += f"""<li>{item['name']} (Qty: {item['quantity']}, Price: {item['price']})</li>"""
-            html += "</ul></div>"
-        elif template_variation == 3:
-            # Template 3 (New variation with a table layout)
-            html = f"""<div id="orderDetailsTable">
-                        <table>
-                            <tr><th>Order ID:</th><td>{order_data['order_id']}</td></tr>
-                            <tr><th>Order Placed:</th><td>{order_data['order_date']}</td></tr>
-                            <tr><th>Total:</th><td>{order_data['order_total']}</td></tr>
-                            <tr><th>Shipping Address:</th><td>{order_data['shipping_address']}</td></tr>
-                            <tr><th>Delivery Status:</th><td>{order_data['delivery_status']}</td></tr>
-                            <tr><th colspan="2">Items:</th></tr>"""
-            for item in order_data["items"]:
-                html += f"""<tr><td>{item['name']}</td><td>Qty: {item['quantity']}, Price: {item['price']}</td></tr>"""
-            html += """</table></div>"""
-        else:
+        orders = []
+        for i in range(count):
+            orders.append({
+                "order_id": f"D01-{ids[i][0]}-{ids[i][1]}",
+                "order_date": f"{years[i]}-{months[i]}-{days[i]}",
+                "order_total": f"${totals[i]:.2f}",
+                "shipping_address": "123 Mavin St, Anytown, LAG, NG 12345",
+                "delivery_status": self.order_statuses[statuses[i]],
+                "items": [
+                    {"name": self.product_names[names[j]], "quantity": quantities[j], "price": f"${prices[j]:.2f}"}
+                    for j in range(offsets[i], offsets[i + 1])
+                ]
+            })
+        return orders
+
+    def generate_html_snippet(self, order_data, template_variation):
+        render = self.templates.get(template_variation)
+        if render is None:
             raise ValueError("Invalid template variation")
+        return render(order_data)
 
-        return html
+    def iter_batches(self, num_examples, chunk_size=4096):
+        """Yields lists of {"html", "output"} examples, `chunk_size` at a time."""
+        variations = list(self.templates)
+        remaining = num_examples
+        while remaining > 0:
+            count = min(chunk_size, remaining)
+            remaining -= count
+            orders = self.generate_orders(count)
+            chosen = self.np_rng.integers(0, len(variations), size=count).tolist()
+            # One mask per noise source, drawn for the whole chunk
+            masks = {
+                name: (self.np_rng.random(count) < probability).tolist()
+                for name, (_, _, probability) in self.noise.items()
+            }
+            batch = []
+            for i, order_data in enumerate(orders):
+                applied = [name for name in self.noise if masks[name][i]]
+                for name in applied:
+                    stage, function, _ = self.noise[name]
+                    if stage == "order":
+                        order_data = function(order_data, self.rng)
+                html = self.generate_html_snippet(order_data, variations[chosen[i]])
+                for name in applied:
+                    stage, function, _ = self.noise[name]
+                    if stage == "html":
+                        html = function(html, self.rng)
+                batch.append({"html": html, "output": json.dumps(order_data)})
+            yield batch
+
+    def iter_examples(self, num_examples, chunk_size=4096):
+        for batch in self.iter_batches(num_examples, chunk_size):
+            yield from batch
 
     def generate_dataset(self, num_examples=1000):
-        data = []
-        for _ in range(num_examples):
-            order_data = self.generate_order_data()
-            template_variation = random.randint(1, 3) # Choose random template
-            html_snippet = self.generate_html_snippet(order_data, template_variation)
-            data.append({
-                "html": html_snippet,
-                "output": json.dumps(order_data, indent=4)
-            })
-        return data
+        return list(self.iter_examples(num_examples))
+
+    def write_parquet_shards(self, output_dir, num_examples, num_shards=8, processes=None, chunk_size=4096, compression="zstd"):
+        """Writes `num_examples` rows as `num_shards` Parquet files, generated in parallel.
+
+        Each shard gets an independent child of the generator's seed, so the
+        output is identical for any number of processes. Returns the shard paths.
+        """
+        import numpy as np
+        from concurrent.futures import ProcessPoolExecutor
+
+        os.makedirs(output_dir, exist_ok=True)
+        seeds = np.random.SeedSequence(self.seed).spawn(num_shards)
+        sizes = [num_examples // num_shards + (1 if i < num_examples % num_shards else 0) for i in range(num_shards)]
+        paths = [os.path.join(output_dir, f"shard-{i:05d}-of-{num_shards:05d}.parquet") for i in range(num_shards)]
+        jobs = [(self, path, size, seed, chunk_size, compression) for path, size, seed in zip(paths, sizes, seeds)]
+        if processes == 1:
+            for job in jobs:
+                _write_shard(*job)
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                for path in executor.map(_write_shard, *zip(*jobs)):
+                    logging.info(f"Wrote {path}")
+        return paths
+
+
+def _write_shard(generator, path, num_examples, seed, chunk_size, compression):
+    # Module level so process pools can pickle it; custom templates and noise
+    # functions must likewise be importable module-level functions
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Writing Parquet shards requires the 'pyarrow' package") from None
+    generator.reseed(seed)
+    schema = pa.schema([("html", pa.string()), ("output", pa.string())])
+    tmp_path = f"{path}.tmp"
+    with pq.ParquetWriter(tmp_path, schema, compression=compression) as writer:
+        for batch in generator.iter_batches(num_examples, chunk_size):
+            writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+    os.replace(tmp_path, path)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic order pages as Parquet shards")
+    parser.add_argument("output_dir")
+    parser.add_argument("--examples", type=int, default=100000)
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--processes", type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=4096)
+    parser.add_argument("--noise", action="append", default=[], metavar="NAME=PROBABILITY",
+                        help=f"Enable built-in noise ({', '.join(NOISE)}), e.g. extra_markup=0.3")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    generator = AmazonOrderDataGenerator(seed=args.seed)
+    for spec in args.noise:
+        name, _, probability = spec.partition("=")
+        generator.add_noise(name, float(probability or 1.0))
+    for path in generator.write_parquet_shards(args.output_dir, args.examples, args.shards, args.processes, args.chunk_size):
+        print(path)
@@ -1,7 +1,10 @@
 import os
 import json
 import time
+import queue
 import logging
+import threading
+from urllib.parse import urljoin
 from selenium.common.exceptions import (
     NoSuchElementException,
     StaleElementReferenceException,
@@ -9,91 +12,344 @@ from selenium.common.exceptions import (
 )
 from llm_interface import LLaMAModel
 from browser_automation_interface import SeleniumAdapter
+from order_extractor import OrderExtractor, SUMMARY_FIELDS, is_complete
+from browser_pool import BrowserPool
+from http_adapter import HTTPPageAdapter, PageFetchError, create_http_session
+from order_index import order_id_from_url, content_hash
+from metrics import metrics
+
+CHECKPOINT_NAME = "fetch_orders"
 
 class AmazonOrderFetcher():
-    def __init__(self, driver: SeleniumAdapter):
+    def __init__(self, driver: SeleniumAdapter, llm_model: LLaMAModel = None, driver_factory=None, concurrency=1, order_index=None, sink=None, export_per_file=False, summary_mode=False, include_items=False, http_detail_pages=False):
         self.driver = driver
-        self.llm_model = LLaMAModel()
+        self.llm_model = llm_model or LLaMAModel()
+        self.order_extractor = OrderExtractor(self.llm_model)
+        # Extra browser sessions are only needed when fetching concurrently
+        self.driver_factory = driver_factory
+        self.concurrency = concurrency
+        # Detail pages are server-rendered: with http_detail_pages they are fetched
+        # over a pooled HTTP session and the browser is kept for interactive steps
+        self.http_detail_pages = http_detail_pages
+        self._http_session = None
+        if concurrency > 1 and driver_factory is None and not http_detail_pages:
+            logging.warning("Concurrent fetching needs a driver_factory; falling back to serial fetching")
+            self.concurrency = 1
+        self._browser_pool = None
+        # Optional OrderIndex enabling incremental sync and crawl checkpoints
+        self.order_index = order_index
+        # Optional StreamingOrderSink; without one, orders are written per file at the end of the run
+        self.sink = sink
+        self.export_per_file = export_per_file
+        # Summary mode reads orders off the history page and only opens detail
+        # pages for orders missing summary fields, or for all when items are wanted
+        self.summary_mode = summary_mode
+        self.include_items = include_items
+        # perf_counter() when the first page of orders was extracted
+        self.first_order_at = None
     
-    def fetch_orders(self, max_retries=3, retry_delay=5):
+    @metrics.timed("stage_seconds", stage="fetch_orders")
+    def fetch_orders(self, max_retries=3, retry_delay=5, resume=False):
         retry_count = 0
+        orders = []
+        # Records this run appends to the sink start here; earlier runs' records are not re-exported
+        sink_offset = self.sink.position() if self.sink is not None else 0
+        # Where the crawl currently is; a retry continues from here instead of page one
+        checkpoint = None
+        if resume and self.order_index:
+            checkpoint = self.order_index.load_checkpoint(CHECKPOINT_NAME)
         while retry_count < max_retries:
             try:
-                logging.info("Fetching order history page...")
-                content = self.driver.get_page_source()
-                # Use LLM to find the "order-history" page
-                element_description = "Find the button for returns & orders that displays the order history"
-                order_history = self.llm_model.find_element_by_description(element_description, self.driver)
-                if order_history:
-                    order_history.click()
+                if checkpoint:
+                    logging.info(f"Resuming order history at page {checkpoint['page']}")
+                    self.driver.navigate_to(checkpoint["page_url"])
+                    self.driver.wait_for_page_ready()
+                elif "order-history" in self.driver.get_current_url():
+                    # A restored session is already checked against the order history page
+                    checkpoint = self._save_checkpoint(1)
                 else:
-                    self.driver.navigate_to("https://www.amazon.com/gp/css/order-history")
-                time.sleep(2)
+                    logging.info("Fetching order history page...")
+                    # Use LLM to find the "order-history" page
+                    element_description = "Find the button for returns & orders that displays the order history"
+                    order_history = self.llm_model.find_element_by_description(element_description, self.driver)
+                    if order_history:
+                        self.driver.click_and_wait(order_history)
+                    else:
+                        self.driver.navigate_to("https://www.amazon.com/gp/css/order-history")
+                        self.driver.wait_for_page_ready()
+                    checkpoint = self._save_checkpoint(1)
 
-                orders = []
                 while True:
+                    page_start = time.perf_counter()
                     html_content = self.driver.get_page_source()
 
-                    # Get order details URLs using LLM
-                    order_details_urls = self.llm_model.get_order_details_urls(html_content)
-
-                    for order_details_url in order_details_urls:
-                        try:
-                            logging.info(f"Navigating to order details: {order_details_url}")
-                            self.driver.navigate_to(order_details_url)  # Navigate to order details page
-                            time.sleep(2) # Ensure page loads
-                            raw_html = self.driver.get_page_source()
-
-                            # Extract order data using the LLM
-                            order_data = {
-                                "json": self.llm_model.extract_order_data(raw_html),
-                                "raw_html": raw_html
-                            }
-                            orders.append(order_data)  # Append extracted order data
-                            self.driver.go_back() # go back to order history 
-
-                            time.sleep(2)  # Give the browser time to load the previous page
+                    if self.summary_mode:
+                        page_orders, listed, skipped = self.fetch_page_summaries(html_content)
+                    else:
+                        # Get order details URLs using LLM
+                        order_details_urls = self.llm_model.get_order_details_urls(html_content)
+                        # Links on the page are usually relative; the browser needs absolute URLs
+                        history_url = self.driver.get_current_url()
+                        order_details_urls = [urljoin(history_url, url) for url in order_details_urls]
+                        pending_urls = self.filter_known_orders(order_details_urls)
+                        page_orders = self.fetch_detail_pages(pending_urls)
+                        listed, skipped = len(order_details_urls), len(order_details_urls) - len(pending_urls)
 
-                        except (NoSuchElementException, StaleElementReferenceException) as e:
-                            logging.warning(f"Error processing order: {e}. Skipping to next order.")
-                            continue # Skipping this order if issue arises
+                    unchanged = skipped + self.index_orders(page_orders)
+                    orders.extend(page_orders)
+                    if page_orders and self.first_order_at is None:
+                        self.first_order_at = time.perf_counter()
+                    metrics.inc("orders_fetched_total", len(page_orders))
+                    metrics.observe("history_page_seconds", time.perf_counter() - page_start)
+                    if self.order_index and listed and unchanged == listed:
+                        logging.info(f"Page {checkpoint['page']} holds only known, unchanged orders. Sync complete.")
+                        break
 
                     try:
                         # Use LLM to find the "Next Page" button (or element)
                         next_page_element = self.llm_model.find_next_page_element(html_content, self.driver) 
                         if next_page_element:
-                            next_page_element.click()
-                            time.sleep(2)
+                            self.driver.click_and_wait(next_page_element)
+                            checkpoint = self._save_checkpoint(checkpoint["page"] + 1)
                         else:
                             break  # No more pages
                     except NoSuchElementException: # No more pages
                         logging.info("No more pages found. All orders fetched.")
                         break
 
-                self.save_orders_as_html(orders=orders)
-                self.save_orders_as_json(orders=orders)
+                if self.order_index:
+                    self.order_index.clear_checkpoint(CHECKPOINT_NAME)
+                logging.info(f"Extraction paths: {dict(self.order_extractor.stats)}")
+                if self.sink is None:
+                    self.save_orders_as_html(orders=orders)
+                    self.save_orders_as_json(orders=orders)
+                elif self.export_per_file:
+                    # Streams records back from the sink instead of holding every page in memory
+                    self.save_orders_as_html(orders=self.sink.iter_orders(with_html=True, offset=sink_offset))
+                    self.save_orders_as_json(orders=self.sink.iter_orders(offset=sink_offset))
 
                 return orders
             
             except TimeoutException:
                 retry_count = retry_count + 1
+                metrics.inc("fetch_retries_total")
                 logging.warning(f"Timeout_error. Retry attempt {retry_count}/{max_retries}")
                 if retry_count < max_retries:
                     time.sleep(retry_delay) # wait before retrying
                 else:
-                    logging.error("Error: Max retries exceeded while loading order history page.")
-                    return []
+                    # Orders from earlier attempts are already in the sink; report them rather than nothing
+                    logging.error(f"Error: Max retries exceeded while loading order history page; returning the {len(orders)} order(s) fetched so far.")
+                    return orders
+
+    def _save_checkpoint(self, page):
+        checkpoint = {"page": page, "page_url": self.driver.get_current_url()}
+        if self.order_index:
+            self.order_index.save_checkpoint(CHECKPOINT_NAME, checkpoint)
+        return checkpoint
+
+    def filter_known_orders(self, order_details_urls):
+        """Drops URLs of indexed orders in a final state; their details cannot change."""
+        if not self.order_index:
+            return order_details_urls
+        pending = [url for url in order_details_urls if not self.order_index.is_final(order_id_from_url(url))]
+        if len(pending) < len(order_details_urls):
+            logging.info(f"Skipping {len(order_details_urls) - len(pending)} finalized order(s)")
+        return pending
+
+    def index_orders(self, orders):
+        """Records orders in the index and returns how many were already known and unchanged."""
+        if not self.order_index:
+            return 0
+        unchanged = 0
+        for order in orders:
+            order_id = order["json"].get("order_id")
+            if order_id in (None, "", "N/A"):
+                order_id = order_id_from_url(order["details_url"])
+            if order_id and not self.order_index.upsert(order_id, order["details_url"], order["json"]):
+                unchanged += 1
+        return unchanged
+
+    def fetch_detail_pages(self, order_details_urls):
+        """Opens each order detail page and extracts it; returns the orders in URL order."""
+        if self.concurrency > 1:
+            return self.fetch_order_details_concurrently(order_details_urls)
+
+        raw_htmls, loaded_urls = [], []
+        for order_details_url in order_details_urls:
+            try:
+                if self.http_detail_pages:
+                    # The browser never leaves the order history page
+                    raw_htmls.append(self.load_order_page(self.create_page_adapter(), order_details_url))
+                    loaded_urls.append(order_details_url)
+                    continue
+                raw_htmls.append(self.load_order_page(self.driver, order_details_url))
+                loaded_urls.append(order_details_url)
+                self.driver.go_back() # go back to order history 
+                self.driver.wait_for_page_ready()
+
+            except (NoSuchElementException, StaleElementReferenceException, PageFetchError) as e:
+                logging.warning(f"Error processing order: {e}. Skipping to next order.")
+                continue # Skipping this order if issue arises
+
+        # Submit the page's extractions together so LLM fallbacks run concurrently
+        return self.extract_orders(raw_htmls, loaded_urls)
+
+    def fetch_page_summaries(self, html_content):
+        """Summary mode: extracts all orders on the current history page in one pass.
+
+        Detail pages are opened only for orders whose summary lacks a
+        SUMMARY_FIELDS value, or for every order when include_items is set.
+        Returns (orders, orders listed on the page, finalized orders skipped).
+        """
+        summaries, path = self.order_extractor.extract_summaries(html_content)
+        history_url = self.driver.get_current_url()
+        orders, detail_urls, skipped = [], [], 0
+        for order_data, details_url, card_html in summaries:
+            details_url = urljoin(history_url, details_url) if details_url else None
+            order_id = order_data.get("order_id")
+            if order_id in (None, "", "N/A"):
+                order_id = order_data["order_id"] = order_id_from_url(details_url) or "N/A"
+            if self.order_index and self.order_index.is_final(order_id):
+                skipped += 1
+            elif details_url and (self.include_items or not is_complete(order_data, SUMMARY_FIELDS)):
+                detail_urls.append(details_url)
+            else:
+                orders.append({
+                    "json": order_data,
+                    "raw_html": card_html,
+                    "details_url": details_url,
+                    "extraction_path": f"summary:{path}"
+                })
+        if skipped:
+            logging.info(f"Skipping {skipped} finalized order(s)")
+        metrics.inc("orders_extracted_total", len(orders), path=f"summary:{path}")
+        if self.sink is not None:
+            orders = [self.sink.write(order) for order in orders]
+        logging.info(f"Read {len(summaries)} order(s) from the history page; opening {len(detail_urls)} detail page(s)")
+        return orders + self.fetch_detail_pages(detail_urls), len(summaries), skipped
+
+    def load_order_page(self, driver, order_details_url):
+        logging.info(f"Navigating to order details: {order_details_url}")
+        with metrics.span("order_load", order_id=order_id_from_url(order_details_url), url=order_details_url):
+            driver.navigate_to(order_details_url)  # Navigate to order details page
+            driver.wait_for_page_ready() # Ensure page loads
+            return driver.get_page_source()
+
+    def extract_orders(self, raw_htmls, order_details_urls):
+        # Extract order data with the known-layout rules, falling back to the LLM
+        with metrics.timer("extraction_batch_seconds"):
+            extracted = self.order_extractor.extract_batch(raw_htmls)
+        orders = [
+            {
+                "json": order_json,
+                "raw_html": raw_html,
+                "details_url": order_details_url,
+                "extraction_path": extraction_path
+            }
+            for raw_html, order_details_url, (order_json, extraction_path) in zip(raw_htmls, order_details_urls, extracted)
+        ]
+        for _, extraction_path in extracted:
+            metrics.inc("orders_extracted_total", path=extraction_path)
+        if self.sink is not None:
+            # Persisted right away; only the compact record stays in memory
+            orders = [self.sink.write(order) for order in orders]
+        return orders
+
+    def fetch_order_details(self, driver, order_details_url):
+        with metrics.span("order", order_id=order_id_from_url(order_details_url)) as span:
+            order = self.extract_orders([self.load_order_page(driver, order_details_url)], [order_details_url])[0]
+            span["extraction_path"] = order["extraction_path"]
+            return order
+
+    def fetch_order_details_concurrently(self, order_details_urls):
+        """Fetches order detail pages with a pool of browser sessions.
+
+        URLs go through a bounded work queue; each worker owns one pooled
+        session, so page loads and extraction of different orders overlap and
+        the main driver never leaves the order history page.
+        """
+        if self._browser_pool is None:
+            if self.http_detail_pages:
+                self._browser_pool = BrowserPool(self.create_page_adapter, self.driver, self.concurrency, cookie_url=None)
+            else:
+                self._browser_pool = BrowserPool(self.driver_factory, self.driver, self.concurrency)
+
+        work = queue.Queue(maxsize=self.concurrency * 2)
+        results = {}
+
+        def worker():
+            session = None
+            try:
+                try:
+                    session = self._browser_pool.acquire()
+                except Exception as e:
+                    logging.error(f"Could not start a browser session for a fetch worker: {e}")
+                while True:
+                    item = work.get()
+                    if item is None:
+                        break
+                    index, order_details_url = item
+                    if session is None:
+                        # Keep draining so the producer never blocks on the bounded queue
+                        logging.warning(f"No browser session to process order {order_details_url}. Skipping to next order.")
+                        continue
+                    try:
+                        results[index] = self.fetch_order_details(session, order_details_url)
+                    except Exception as e:
+                        # A dead worker would leave the bounded queue full, so never let one escape
+                        logging.warning(f"Error processing order {order_details_url}: {e}. Skipping to next order.")
+            finally:
+                if session is not None:
+                    self._browser_pool.release(session)
+
+        workers = [threading.Thread(target=worker, daemon=True) for _ in range(min(self.concurrency, len(order_details_urls)))]
+        for thread in workers:
+            thread.start()
+        for item in enumerate(order_details_urls):
+            work.put(item)
+        for _ in workers:
+            work.put(None)
+        for thread in workers:
+            thread.join()
+
+        return [results[index] for index in sorted(results)]
+
+    def create_page_adapter(self):
+        """An HTTPPageAdapter on the shared session, which carries the browser's current cookies."""
+        if self._http_session is None:
+            self._http_session = create_http_session(self.driver, pool_size=self.concurrency)
+        return HTTPPageAdapter(self._http_session)
+
+    def close(self):
+        if self._browser_pool is not None:
+            self._browser_pool.close()
+            self._browser_pool = None
+        if self._http_session is not None:
+            self._http_session.close()
+            self._http_session = None
+
+    @staticmethod
+    def _order_file_stem(order):
+        # Failed extractions have no order_id or date; the URL or a hash of the data still names them
+        order_json = order.get('json') or {}
+        order_id = order_json.get('order_id')
+        if order_id in (None, "", "N/A"):
+            order_id = order_id_from_url(order.get('details_url')) or f"unknown-{content_hash(order_json)[:12]}"
+        order_date = order_json.get('order_date') or "N/A"
+        return f"order_{order_id}_{order_date.replace(' ', '_').replace(',', '').replace('/', '-')}"
 
     def save_orders_as_html(self, orders, directory="order_html"):
         os.makedirs(directory, exist_ok=True) # Create directory if not exists
         for order in orders:
-            filename = f"{directory}/order_{order['json']['order_id']}_{order['json']['order_date'].replace(' ', '_').replace(',', '')}.html"
+            if not order.get('raw_html'):
+                continue # LLM-read history summaries have no page of their own
+            filename = f"{directory}/{self._order_file_stem(order)}.html"
             with open(filename, 'w', encoding='utf-8') as file:
                 file.write(order['raw_html']) # Save the raw HTML
 
     def save_orders_as_json(self, orders, directory="order_json"):
         os.makedirs(directory, exist_ok=True)  # Create directory if not exists
         for order in orders:
-            filename = f"{directory}/order_{order['json']['order_id']}_{order['json']['order_date'].replace(' ', '_').replace(',', '')}.json"
+            filename = f"{directory}/{self._order_file_stem(order)}.json"
             with open(filename, 'w', encoding='utf-8') as file:
                 json.dump(order['json'], file, indent=4)  # Save the 'json' part of the order
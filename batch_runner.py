@@ -0,0 +1,321 @@
+"""Runs the agent for many Amazon accounts at once.
+
+    python batch_runner.py accounts.json --max-browsers 6 --max-llm-in-flight 8 --llm-rate-limit 5
+
+accounts.json is a list of accounts, or {"defaults": {...}, "accounts": [...]}
+where defaults apply to every account. Each account takes:
+
+    name            unique label; also the default output directory name
+    email           or email_env: the environment variable holding it
+    password        or password_env: the environment variable holding it
+    output_dir      where the account's orders, index, caches, session and log go
+    concurrency, summary_mode, include_items, http_detail_pages, export_per_file
+                    passed to Agent
+
+Every account runs in its own process with its own browsers and working
+directory. All of them share one LLM backend living in a manager process,
+so the in-flight and rate limits hold across the whole batch.
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import current_process
+from multiprocessing.managers import BaseManager
+from llm_client import LLMClient
+from llm_interface import DEFAULT_API_URL
+from metrics import metrics
+
+AGENT_OPTIONS = ("concurrency", "summary_mode", "include_items", "http_detail_pages", "export_per_file")
+DEFAULT_MAX_BROWSERS = 4
+DEFAULT_MAX_LLM_IN_FLIGHT = 8
+
+
+class SharedLLMBackend:
+    """The batch's only LLM client; lives in the manager process and serves every worker.
+
+    Workers call `generate`/`generate_batch` through a manager proxy, each
+    call in its own manager thread, so `max_in_flight` and `rate_limit` cap
+    the batch as a whole. The local backend batches concurrent prompts from
+    all accounts into shared `generate` calls.
+    """
+
+    def __init__(self, backend="http", api_url=DEFAULT_API_URL, max_in_flight=DEFAULT_MAX_LLM_IN_FLIGHT, rate_limit=None, model_dir="fine_tuned_llama", quantize=None):
+        self.backend = backend
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._stats = {"prompts": 0, "failures": 0, "in_flight": 0, "peak_in_flight": 0, "busy_seconds": 0.0}
+        if backend == "local":
+            from local_llm import LocalLLaMAModel
+            self._model = LocalLLaMAModel(model_dir=model_dir, quantize=quantize, max_batch_size=max_in_flight)
+            self._client = None
+        else:
+            headers = {"Authorization": f"Bearer {os.environ.get('HUGGINGFACE_HUB_TOKEN')}"}
+            self._client = LLMClient(api_url, headers=headers, max_in_flight=max_in_flight, rate_limit=rate_limit)
+            self._model = None
+
+    def _run(self, prompts, call):
+        with self._slots:
+            with self._lock:
+                self._stats["in_flight"] += len(prompts)
+                self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._stats["in_flight"])
+            start = time.perf_counter()
+            try:
+                return call()
+            except Exception:
+                with self._lock:
+                    self._stats["failures"] += len(prompts)
+                raise
+            finally:
+                with self._lock:
+                    self._stats["in_flight"] -= len(prompts)
+                    self._stats["prompts"] += len(prompts)
+                    self._stats["busy_seconds"] += time.perf_counter() - start
+
+    def generate(self, prompt, max_tokens=200, **parameters):
+        if self._model is not None:
+            # Workers send their output schema the way a TGI endpoint takes it
+            schema = parameters.get("grammar", {}).get("value")
+            return self._run([prompt], lambda: self._model._call_llm(prompt, max_tokens, schema))
+        return self._run([prompt], lambda: self._client.generate(prompt, max_tokens, **parameters))
+
+    def generate_batch(self, prompts, max_tokens=200, **parameters):
+        # Prompts are fanned out one by one so each takes its own in-flight slot
+        threads, results = [], [None] * len(prompts)
+        errors = []
+
+        def generate_one(index, prompt):
+            try:
+                results[index] = self.generate(prompt, max_tokens, **parameters)
+            except Exception as e:
+                errors.append(e)
+
+        for index, prompt in enumerate(prompts):
+            thread = threading.Thread(target=generate_one, args=(index, prompt), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+
+_backend = None
+
+
+def _init_backend(config):
+    global _backend
+    _backend = SharedLLMBackend(**config)
+
+
+def _get_backend():
+    return _backend
+
+
+class LLMManager(BaseManager):
+    pass
+
+
+LLMManager.register("get_backend", callable=_get_backend, exposed=("generate", "generate_batch", "stats"))
+
+
+def load_accounts(path):
+    with open(path, 'r', encoding='utf-8') as file:
+        config = json.load(file)
+    defaults, accounts = {}, config
+    if isinstance(config, dict):
+        defaults, accounts = config.get("defaults", {}), config["accounts"]
+    accounts = [dict(defaults, **account) for account in accounts]
+    names = [account.get("name") for account in accounts]
+    if None in names or len(set(names)) != len(names):
+        raise ValueError("Every account needs a unique name")
+    for account in accounts:
+        account.setdefault("output_dir", os.path.join("accounts", account["name"]))
+    return accounts
+
+
+def browsers_needed(account):
+    """The main browser plus the pooled sessions a concurrent detail fetch opens."""
+    concurrency = account.get("concurrency", 1)
+    if concurrency > 1 and not account.get("http_detail_pages"):
+        return 1 + concurrency
+    return 1
+
+
+def _credential(account, field):
+    if account.get(field):
+        return account[field]
+    if account.get(f"{field}_env"):
+        value = os.environ.get(account[f"{field}_env"])
+        if not value:
+            raise ValueError(f"Environment variable {account[f'{field}_env']} for account {account['name']} is not set")
+        return value
+    return None
+
+
+def run_account(account, llm_address, authkey, model_config):
+    """Worker process: runs one account's Agent in its own output directory and reports back."""
+    from agent import Agent
+    from llm_interface import LLaMAModel
+
+    result = {"name": account["name"], "status": "ok", "orders": 0}
+    start = time.perf_counter()
+    os.makedirs(account["output_dir"], exist_ok=True)
+    os.chdir(account["output_dir"])
+    metrics.reset()
+    try:
+        manager = LLMManager(address=llm_address, authkey=authkey)
+        manager.connect()
+        llm_model = LLaMAModel(api_url=model_config["identity"], llm_client=manager.get_backend())
+        if model_config.get("model_dir"):
+            # Token counts and cache keys follow the model that actually runs
+            llm_model.model_name = model_config["model_dir"]
+        llm_model.json_grammar = model_config.get("json_grammar", False)
+        agent = Agent(
+            llm_model=llm_model,
+            email=_credential(account, "email"),
+            password=_credential(account, "password"),
+            **{option: account[option] for option in AGENT_OPTIONS if option in account}
+        )
+        result["session_restored"] = agent.session_restored
+        agent.fetch_order_details()
+        sink = agent.order_fetcher.sink
+        result["orders"] = sink.records_written if sink is not None else 0
+        result["time_to_first_order_seconds"] = agent.time_to_first_order
+    except Exception as e:
+        logging.exception(f"Account {account['name']} failed")
+        result.update(status="failed", error=f"{type(e).__name__}: {e}", traceback=traceback.format_exc())
+    finally:
+        result["seconds"] = time.perf_counter() - start
+        snapshot = metrics.snapshot()
+        result["llm_prompts"] = sum(series["value"] for series in snapshot["counters"].get("llm_prompts_total", []))
+        metrics.write("agent_metrics.json")
+    return result
+
+
+def run_batch(
+    accounts,
+    max_browsers=DEFAULT_MAX_BROWSERS,
+    max_llm_in_flight=DEFAULT_MAX_LLM_IN_FLIGHT,
+    llm_rate_limit=None,
+    llm_backend="http",
+    api_url=DEFAULT_API_URL,
+    model_dir="fine_tuned_llama",
+    quantize=None,
+    json_grammar=False,
+    worker=run_account
+):
+    """Runs every account and returns the aggregate report.
+
+    Accounts are started in order as long as the browsers they need fit
+    under `max_browsers`; one whose concurrency alone exceeds the cap is
+    scaled down to fit. `worker` runs in the child process and must be a
+    module-level function with run_account's signature.
+    """
+    accounts = [dict(account, output_dir=os.path.abspath(account["output_dir"])) for account in accounts]
+    for account in accounts:
+        if browsers_needed(account) > max_browsers:
+            logging.warning(f"Account {account['name']} would need {browsers_needed(account)} browsers; limiting it to {max_browsers}")
+            account["concurrency"] = max(1, max_browsers - 1)
+
+    backend_config = {
+        "backend": llm_backend, "api_url": api_url, "max_in_flight": max_llm_in_flight,
+        "rate_limit": llm_rate_limit, "model_dir": model_dir, "quantize": quantize
+    }
+    model_config = {"identity": model_dir if llm_backend == "local" else api_url, "json_grammar": json_grammar}
+    if llm_backend == "local":
+        # The local backend constrains decoding itself once it is given the schema
+        model_config.update(model_dir=model_dir, json_grammar=True)
+
+    manager = LLMManager(authkey=bytes(current_process().authkey))
+    manager.start(initializer=_init_backend, initargs=(backend_config,))
+    pending, running, results = deque(accounts), {}, []
+    browsers_in_use = peak_browsers = 0
+    start = time.perf_counter()
+    try:
+        # One account per process, so a crashed or leaky run never affects the next
+        with ProcessPoolExecutor(max_workers=max_browsers, max_tasks_per_child=1) as pool:
+            while pending or running:
+                while pending and browsers_in_use + browsers_needed(pending[0]) <= max_browsers:
+                    account = pending.popleft()
+                    future = pool.submit(worker, account, manager.address, bytes(current_process().authkey), model_config)
+                    running[future] = account
+                    browsers_in_use += browsers_needed(account)
+                    peak_browsers = max(peak_browsers, browsers_in_use)
+                    logging.info(f"Started account {account['name']} ({browsers_in_use}/{max_browsers} browsers in use)")
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    account = running.pop(future)
+                    browsers_in_use -= browsers_needed(account)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # The worker process itself died
+                        result = {"name": account["name"], "status": "failed", "orders": 0, "error": f"{type(e).__name__}: {e}"}
+                    results.append(result)
+                    print(f"{result['name']}: {result['status']}, {result['orders']} orders")
+        llm_stats = manager.get_backend().stats()
+    finally:
+        manager.shutdown()
+
+    seconds = time.perf_counter() - start
+    orders = sum(result["orders"] for result in results)
+    failed = [result for result in results if result["status"] != "ok"]
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "accounts": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "failures": {result["name"]: result.get("error") for result in failed},
+        "orders": orders,
+        "wall_seconds": seconds,
+        "orders_per_second": orders / seconds if seconds else 0.0,
+        "peak_browsers": peak_browsers,
+        "max_browsers": max_browsers,
+        "llm": llm_stats,
+        "account_results": sorted(results, key=lambda result: result["name"]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("accounts", help="JSON file with the account configs")
+    parser.add_argument("--max-browsers", type=int, default=DEFAULT_MAX_BROWSERS, help="Browsers open at once across all accounts")
+    parser.add_argument("--max-llm-in-flight", type=int, default=DEFAULT_MAX_LLM_IN_FLIGHT, help="LLM requests in flight across all accounts")
+    parser.add_argument("--llm-rate-limit", type=float, help="LLM requests per second across all accounts")
+    parser.add_argument("--llm-backend", choices=("http", "local"), default=os.environ.get("LLM_BACKEND", "http"))
+    parser.add_argument("--api-url", default=DEFAULT_API_URL)
+    parser.add_argument("--model-dir", default=os.environ.get("LOCAL_MODEL_DIR", "fine_tuned_llama"))
+    parser.add_argument("--quantize", default=os.environ.get("LOCAL_MODEL_QUANTIZE"))
+    parser.add_argument("--json-grammar", action="store_true", help="Send the order JSON schema as a TGI grammar")
+    parser.add_argument("--report", default="batch_report.json")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    report = run_batch(
+        load_accounts(args.accounts),
+        max_browsers=args.max_browsers,
+        max_llm_in_flight=args.max_llm_in_flight,
+        llm_rate_limit=args.llm_rate_limit,
+        llm_backend=args.llm_backend,
+        api_url=args.api_url,
+        model_dir=args.model_dir,
+        quantize=args.quantize,
+        json_grammar=args.json_grammar
+    )
+    with open(args.report, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=4)
+    print(
+        f"{report['succeeded']}/{report['accounts']} accounts succeeded, {report['orders']} orders "
+        f"in {report['wall_seconds']:.1f}s ({report['orders_per_second']:.2f} orders/s); report written to {args.report}"
+    )
@@ -0,0 +1,47 @@
+"""Measures cold-start time of the Agent construction path without launching Chrome.
+
+Each sample runs in a fresh interpreter so module imports are not cached:
+
+    python benchmarks/cold_start.py --runs 5
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import time
+start = time.perf_counter()
+import agent
+from llm_interface import LLaMAModel
+imported = time.perf_counter()
+LLaMAModel()
+constructed = time.perf_counter()
+print(imported - start, constructed - imported)
+"""
+
+
+def measure(runs):
+    imports, constructions = [], []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", PROBE], cwd=REPO_ROOT, check=True, capture_output=True, text=True
+        ).stdout.split()
+        imports.append(float(output[-2]))
+        constructions.append(float(output[-1]))
+    return {
+        "runs": runs,
+        "import_seconds_median": statistics.median(imports),
+        "llm_model_init_seconds_median": statistics.median(constructions),
+        "total_seconds_median": statistics.median(i + c for i, c in zip(imports, constructions)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    print(json.dumps(measure(parser.parse_args().runs), indent=4))
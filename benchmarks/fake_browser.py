@@ -0,0 +1,204 @@
+"""An in-memory Amazon look-alike served through BrowserAutomationInterface.
+
+FakeSite renders sign-in, home, paginated order-history and order-detail
+pages from AmazonOrderDataGenerator; FakeBrowser navigates it with
+configurable page-load latency, so the whole pipeline runs offline.
+Account pages under /gp/ redirect to sign-in unless the browser holds the
+session cookie the password form sets, as on the real site.
+"""
+import os
+import sys
+import time
+import random
+from urllib.parse import urljoin, urlparse, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from selenium.common.exceptions import NoSuchElementException
+from selenium.webdriver.common.by import By
+from amazon_data_generator import AmazonOrderDataGenerator
+from browser_automation_interface import BrowserAutomationInterface
+
+BASE_URL = "https://www.amazon.com"
+SESSION_COOKIE = "session-token"
+
+# Non-content markup real pages carry; gives the HTML reducer something to strip
+PAGE_NOISE = """<head><script>window.ue_t0=+new Date();var tracking={"a":"%s"};</script>
+<style>.a-box{border:1px solid #ddd}.nav-sprite{background:url(sprite.png)}</style></head>"""
+
+UNKNOWN_LAYOUT = """<div id="orderSummaryCard"><dl>
+<dt>Order ID</dt><dd>{order_id}</dd><dt>Order date</dt><dd>{order_date}</dd><dt>Grand total</dt><dd>{order_total}</dd>
+</dl></div>"""
+
+
+class FakeSite:
+    def __init__(self, num_orders=50, page_size=10, unknown_layout_ratio=0.0, seed=0):
+        rng = self.rng = random.Random(seed)
+        generator = AmazonOrderDataGenerator(seed=seed)
+        self.page_size = page_size
+        self.session_token = f"{rng.getrandbits(64):016x}"
+        self.orders = [generator.generate_order_data() for _ in range(num_orders)]
+        self.details = {}
+        for order in self.orders:
+            if rng.random() < unknown_layout_ratio:
+                body = UNKNOWN_LAYOUT.format(**order)
+            else:
+                body = generator.generate_html_snippet(order, rng.randint(1, 3))
+            self.details[order["order_id"]] = self._page(body)
+
+    def _page(self, body):
+        return f"<html>{PAGE_NOISE % self.rng.random()}<body>{body}</body></html>"
+
+    def render(self, url):
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        if parsed.path == "/ap/signin":
+            return self._page(
+                '<form action="/ap/signin/password"><input type="email" name="email" id="ap_email">'
+                '<input type="submit" id="continue" value="Continue"></form>'
+            )
+        if parsed.path == "/ap/signin/password":
+            return self._page(
+                '<form action="/"><input type="password" name="password" id="ap_password">'
+                '<input type="submit" id="signInSubmit" value="Sign In"></form>'
+            )
+        if parsed.path == "/gp/css/order-history":
+            return self._page(self._history(int(query.get("startIndex", ["0"])[0])))
+        if parsed.path == "/gp/your-account/order-details":
+            return self.details.get(query.get("orderID", [""])[0], self._page("<p>Order not found</p>"))
+        return self._page(
+            '<div id="nav-tools"><a id="nav-link-accountList" href="/gp/css/homepage.html">Your Account</a>'
+            '<a id="nav-orders" href="/gp/css/order-history">Returns &amp; Orders</a></div>'
+        )
+
+    def _history(self, start):
+        cards = []
+        for order in self.orders[start:start + self.page_size]:
+            cards.append(
+                f'<div class="order-card js-order-card">'
+                f'<div class="order-header"><span class="label">Order placed</span><span class="value">{order["order_date"]}</span>'
+                f'<span class="label">Total</span><span class="value">{order["order_total"]}</span>'
+                f'<span class="label">Order #</span><span class="value">{order["order_id"]}</span></div>'
+                f'<div class="delivery-box"><span class="delivery-box__primary-text">{order["delivery_status"]}</span></div>'
+                f'<a class="a-link-normal" href="/gp/your-account/order-details?orderID={order["order_id"]}">View order details</a>'
+                f'</div>'
+            )
+        pagination = ""
+        if start + self.page_size < len(self.orders):
+            pagination = (
+                f'<ul class="a-pagination"><li class="a-last">'
+                f'<a href="/gp/css/order-history?startIndex={start + self.page_size}">Next</a></li></ul>'
+            )
+        return f'<div id="ordersContainer">{"".join(cards)}{pagination}</div>'
+
+
+class FakeElement:
+    def __init__(self, browser, tag):
+        self.browser = browser
+        self.tag = tag
+        self.value = ""
+
+    @property
+    def text(self):
+        return self.tag.get_text(" ", strip=True)
+
+    def get_attribute(self, name):
+        return self.tag.get(name)
+
+    def send_keys(self, value):
+        self.value += value
+
+    def click(self):
+        if self.tag.get("href"):
+            self.browser.navigate_to(self.tag["href"])
+            return
+        form = self.tag.find_parent("form")
+        if form is not None and self.tag.get("type") == "submit":
+            self.browser.navigate_to(form.get("action", "/"))
+
+
+class FakeBrowser(BrowserAutomationInterface):
+    def __init__(self, site, page_latency=0.0):
+        self.site = site
+        self.page_latency = page_latency
+        self.url = BASE_URL + "/"
+        self.history = []
+        self.cookies = []
+        self.storage = {"localStorage": {"csm-hit": "tb:benchmark"}, "sessionStorage": {}}
+        self.page_loads = 0
+        self.page_load_seconds = 0.0
+        self._soup = None
+
+    def get_page_source(self):
+        return self.site.render(self.url)
+
+    def find_element(self, by, value):
+        if self._soup is None:
+            self._soup = BeautifulSoup(self.get_page_source(), "html.parser")
+        selector = {By.ID: f"#{value}", By.NAME: f'[name="{value}"]'}.get(by, value)
+        tag = self._soup.select_one(selector)
+        if tag is None:
+            raise NoSuchElementException(f"No element matches {selector}")
+        return FakeElement(self, tag)
+
+    def navigate_to(self, url):
+        start = time.perf_counter()
+        if self.page_latency:
+            time.sleep(self.page_latency)
+        self.history.append(self.url)
+        self.url = urljoin(self.url, url)
+        path = urlparse(self.url).path
+        if path == "/" and urlparse(self.history[-1]).path == "/ap/signin/password":
+            # Submitting the password form signs the browser in
+            self.add_cookie({"name": SESSION_COOKIE, "value": self.site.session_token, "domain": ".amazon.com"})
+        elif path.startswith("/gp/") and not self.is_signed_in():
+            self.url = urljoin(BASE_URL, "/ap/signin")
+        self._soup = None
+        self.page_loads += 1
+        self.page_load_seconds += time.perf_counter() - start
+
+    def go_back(self):
+        if self.history:
+            self.url = self.history.pop()
+            self._soup = None
+
+    def get_current_url(self):
+        return self.url
+
+    # Pages are complete as soon as navigate_to returns
+    def wait_for_page_ready(self, timeout=None):
+        return True
+
+    def wait_for_element(self, by, value, timeout=None):
+        return self.find_element(by, value)
+
+    def wait_for_url_change(self, old_url, timeout=None):
+        return self.url != old_url
+
+    def wait_for_dom_quiet(self, quiet_period=0.5, timeout=None):
+        return True
+
+    def get_cookies(self):
+        return list(self.cookies)
+
+    def add_cookie(self, cookie):
+        self.cookies = [c for c in self.cookies if c["name"] != cookie["name"]] + [dict(cookie)]
+
+    def delete_all_cookies(self):
+        self.cookies = []
+
+    def is_signed_in(self):
+        return any(c["name"] == SESSION_COOKIE and c["value"] == self.site.session_token for c in self.cookies)
+
+    def get_storage(self, kind="localStorage"):
+        return dict(self.storage.get(kind, {}))
+
+    def set_storage(self, items, kind="localStorage"):
+        self.storage.setdefault(kind, {}).update(items)
+
+    def clear_storage(self, kind="localStorage"):
+        self.storage.pop(kind, None)
+
+    def quit(self):
+        pass
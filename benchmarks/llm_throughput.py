@@ -0,0 +1,56 @@
+"""Compares prompt and token throughput of the HTTP and local LLM backends.
+
+    python benchmarks/llm_throughput.py --backend http --prompts 32
+    python benchmarks/llm_throughput.py --backend local --model-dir fine_tuned_llama --quantize int8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from amazon_data_generator import AmazonOrderDataGenerator
+from llm_interface import LLaMAModel, ORDER_DATA_PROMPT
+
+
+def build_backend(args):
+    if args.backend == "local":
+        from local_llm import LocalLLaMAModel
+        return LocalLLaMAModel(model_dir=args.model_dir, quantize=args.quantize, max_batch_size=args.batch_size)
+    return LLaMAModel(api_url=args.api_url) if args.api_url else LLaMAModel()
+
+
+def run(args):
+    generator = AmazonOrderDataGenerator(seed=args.seed)
+    prompts = [ORDER_DATA_PROMPT.format(html_content=example["html"]) for example in generator.iter_examples(args.prompts)]
+    backend = build_backend(args)
+    backend._call_llm_batch(prompts[:1], args.max_tokens)  # Warm-up: model load, connection setup
+
+    start = time.perf_counter()
+    outputs = backend._call_llm_batch(prompts, args.max_tokens)
+    elapsed = time.perf_counter() - start
+
+    generated_tokens = sum(backend.count_tokens(output) for output in outputs)
+    return {
+        "backend": args.backend,
+        "prompts": len(prompts),
+        "seconds": elapsed,
+        "prompts_per_second": len(prompts) / elapsed,
+        "generated_tokens": generated_tokens,
+        "tokens_per_second": generated_tokens / elapsed,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["http", "local"], default="http")
+    parser.add_argument("--api-url", help="Override the inference endpoint, e.g. a local stub server")
+    parser.add_argument("--model-dir", default="fine_tuned_llama")
+    parser.add_argument("--quantize", choices=["int8"])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--prompts", type=int, default=32)
+    parser.add_argument("--max-tokens", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    print(json.dumps(run(parser.parse_args()), indent=4))
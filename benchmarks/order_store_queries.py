@@ -0,0 +1,96 @@
+"""Times OrderStore imports and queries over generated orders.
+
+Orders come from AmazonOrderDataGenerator (1-5 items each); a share of them
+is added a second time with a later fetch time, as a re-scraped order with a
+new status would be, so the queries also pay for keeping only the latest
+version:
+
+    python benchmarks/order_store_queries.py --orders 200000
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from amazon_data_generator import AmazonOrderDataGenerator
+from order_store import OrderStore
+
+
+def _timed(function, repeat):
+    """Best-of-`repeat` seconds and the last result."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return best, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--refetched", type=float, default=0.05, help="Share of orders stored a second time")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    generator = AmazonOrderDataGenerator(seed=args.seed)
+    orders = generator.generate_orders(args.orders)
+    step = max(1, round(1 / args.refetched)) if args.refetched else 0
+    refetched = [dict(order, delivery_status="Returned") for order in orders[::step]] if step else []
+
+    directory = tempfile.mkdtemp(prefix="order-store-bench-")
+    try:
+        store = OrderStore(directory)
+        start = time.perf_counter()
+        store.add({"json": order, "fetched_at": 1} for order in orders)
+        store.add({"json": order, "fetched_at": 2} for order in refetched)
+        store.flush()
+        import_seconds = time.perf_counter() - start
+
+        load_seconds, (order_table, item_table) = _timed(lambda: OrderStore(directory).tables(), args.repeat)
+        queries = {
+            "totals_by_month": lambda: store.totals_by_month(),
+            "totals_by_month_2023": lambda: store.totals_by_month("2023-01", "2023-12"),
+            "totals_by_status": lambda: store.totals_by_status(),
+            "top_items_by_spend": lambda: store.top_items(10),
+            "top_items_by_quantity": lambda: store.top_items(10, by="quantity"),
+        }
+        query_seconds = {}
+        for name, query in queries.items():
+            query_seconds[name], _ = _timed(query, args.repeat)
+        store.tables()
+        # A fresh store reads the Parquet parts before its first query
+        cold_seconds, _ = _timed(lambda: OrderStore(directory).totals_by_status(), 1)
+        disk_bytes = sum(
+            os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(directory) for name in names
+        )
+        results = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": {key: value for key, value in vars(args).items() if key != "output"},
+            "orders_added": len(orders) + len(refetched),
+            "orders_stored": order_table.num_rows,
+            "items_stored": item_table.num_rows,
+            "disk_mb": disk_bytes / 2 ** 20,
+            "import_seconds": import_seconds,
+            "import_orders_per_second": (len(orders) + len(refetched)) / import_seconds,
+            "load_seconds": load_seconds,
+            "query_seconds": query_seconds,
+            "cold_query_seconds": cold_seconds,
+            "top_items": store.top_items(3),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    print(json.dumps(results, indent=4, default=str))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=4, default=str)
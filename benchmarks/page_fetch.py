@@ -0,0 +1,239 @@
+"""Compares order-detail page loads over HTTPPageAdapter with loads in headless Chrome.
+
+FakeSite is served on a local HTTP server (gzip-compressed, and brotli when
+the brotli package is installed) that, like Amazon, redirects account pages
+to sign-in without the session cookie. Both paths fetch the same detail
+pages; pages/sec and the peak RSS of the process tree are reported:
+
+    python benchmarks/page_fetch.py --pages 200 --concurrency 4
+    python benchmarks/page_fetch.py --pages 200 --selenium   # needs Chrome and chromedriver
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+try:
+    import psutil
+except ImportError:  # Falls back to this process's own peak RSS
+    psutil = None
+
+from http_adapter import HTTPPageAdapter, create_http_session
+from fake_browser import FakeSite, FakeBrowser, SESSION_COOKIE
+
+
+class FakeSiteServer:
+    """Serves FakeSite over HTTP on localhost and counts the bytes it sends."""
+
+    def __init__(self, site):
+        self.site = site
+        self.bytes_sent = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+            # Headers and body go out as separate writes; Nagle would hold the body back
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path.startswith("/gp/") and f"{SESSION_COOKIE}={server.site.session_token}" not in self.headers.get("Cookie", ""):
+                    self.send_response(302)
+                    self.send_header("Location", "/ap/signin")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = server.site.render(self.path).encode("utf-8")
+                accepted = self.headers.get("Accept-Encoding", "")
+                encoding = None
+                if brotli is not None and "br" in accepted:
+                    body, encoding = brotli.compress(body), "br"
+                elif "gzip" in accepted:
+                    body, encoding = gzip.compress(body, compresslevel=6), "gzip"
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                if encoding:
+                    self.send_header("Content-Encoding", encoding)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.bytes_sent += len(body)
+                    server.requests += 1
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class RSSSampler:
+    """Samples the RSS of this process and its children (Chrome) in the background."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current():
+        if psutil is None:
+            import resource
+            # ru_maxrss is in KiB on Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.current())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def _fetch_all(adapters, urls):
+    """Loads every URL with a pool of adapters, one worker per adapter; returns bytes of page source."""
+    free = list(adapters)
+    lock = threading.Lock()
+
+    def load(url):
+        with lock:
+            adapter = free.pop()
+        try:
+            adapter.navigate_to(url)
+            adapter.wait_for_page_ready()
+            return len(adapter.get_page_source())
+        finally:
+            with lock:
+                free.append(adapter)
+
+    with ThreadPoolExecutor(max_workers=len(adapters)) as executor:
+        return sum(executor.map(load, urls))
+
+
+def _measure(name, adapters, urls, baseline_rss):
+    with RSSSampler() as sampler:
+        start = time.perf_counter()
+        page_bytes = _fetch_all(adapters, urls)
+        seconds = time.perf_counter() - start
+    return {
+        "path": name,
+        "pages": len(urls),
+        "seconds": seconds,
+        "pages_per_second": len(urls) / seconds if seconds else 0.0,
+        "page_source_bytes": page_bytes,
+        "peak_rss_mb": sampler.peak / 2 ** 20,
+        "rss_over_baseline_mb": (sampler.peak - baseline_rss) / 2 ** 20,
+    }
+
+
+def run_http(server, urls, concurrency, baseline_rss):
+    browser = FakeBrowser(server.site)
+    browser.add_cookie({"name": SESSION_COOKIE, "value": server.site.session_token, "domain": "127.0.0.1"})
+    session = create_http_session(browser, pool_size=concurrency)
+    server.bytes_sent = server.requests = 0
+    result = _measure("http", [HTTPPageAdapter(session) for _ in range(concurrency)], urls, baseline_rss)
+    session.close()
+    result["wire_bytes"] = server.bytes_sent
+    result["requests"] = server.requests
+    return result
+
+
+def run_selenium(server, urls, concurrency, baseline_rss):
+    from amazon_authenticator import AmazonAuthenticator
+    server.bytes_sent = server.requests = 0
+    drivers = []
+    with RSSSampler() as startup:
+        start = time.perf_counter()
+        for _ in range(concurrency):
+            driver = AmazonAuthenticator.create_driver(None)
+            # Cookies can only be set for the domain the browser is on
+            driver.navigate_to(server.url + "/")
+            driver.add_cookie({"name": SESSION_COOKIE, "value": server.site.session_token})
+            drivers.append(driver)
+        startup_seconds = time.perf_counter() - start
+    try:
+        result = _measure("selenium", drivers, urls, baseline_rss)
+    finally:
+        for driver in drivers:
+            driver.quit()
+    result["browser_startup_seconds"] = startup_seconds
+    result["peak_rss_mb"] = max(result["peak_rss_mb"], startup.peak / 2 ** 20)
+    result["wire_bytes"] = server.bytes_sent
+    result["requests"] = server.requests
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--selenium", action="store_true", help="Also load the pages in headless Chrome")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    site = FakeSite(num_orders=args.pages, seed=args.seed)
+    server = FakeSiteServer(site).start()
+    urls = [f"{server.url}/gp/your-account/order-details?orderID={order['order_id']}" for order in site.orders]
+    baseline_rss = RSSSampler.current()
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "content_encoding": "br" if brotli is not None else "gzip",
+        "baseline_rss_mb": baseline_rss / 2 ** 20,
+        "runs": [],
+    }
+    try:
+        results["runs"].append(run_http(server, urls, args.concurrency, baseline_rss))
+        if args.selenium:
+            results["runs"].append(run_selenium(server, urls, args.concurrency, baseline_rss))
+    finally:
+        server.stop()
+
+    print(json.dumps(results, indent=4))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=4)
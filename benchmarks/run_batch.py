@@ -0,0 +1,81 @@
+"""Runs batch_runner over several fake accounts offline.
+
+Each account gets its own FakeSite (FakeBrowser instead of Chrome); every
+worker's LLM traffic goes through the shared backend to the stub server:
+
+    python benchmarks/run_batch.py --accounts 6 --orders 40 --max-browsers 4 --max-llm-in-flight 4
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import batch_runner
+from stub_llm_server import StubLLMServer
+
+
+def run_fake_account(account, llm_address, authkey, model_config):
+    """batch_runner worker with the browser and tokenizer swapped for offline stand-ins."""
+    from amazon_authenticator import AmazonAuthenticator
+    from html_reducer import estimate_tokens
+    from llm_interface import LLaMAModel
+    from fake_browser import FakeSite, FakeBrowser
+
+    site = FakeSite(account["fake_orders"], seed=account["fake_seed"])
+    AmazonAuthenticator.create_driver = lambda authenticator: FakeBrowser(site, page_latency=account["page_latency"])
+    LLaMAModel.count_tokens = lambda self, text: estimate_tokens(text)
+    return batch_runner.run_account(account, llm_address, authkey, model_config)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=4)
+    parser.add_argument("--orders", type=int, default=30, help="Orders per account")
+    parser.add_argument("--concurrency", type=int, default=1, help="Per-account detail-page concurrency")
+    parser.add_argument("--max-browsers", type=int, default=4)
+    parser.add_argument("--max-llm-in-flight", type=int, default=4)
+    parser.add_argument("--llm-rate-limit", type=float)
+    parser.add_argument("--page-latency", type=float, default=0.01)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--output", help="Also write the report to this JSON file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="batch-bench-")
+    accounts = [
+        {
+            "name": f"account-{number}",
+            "email": f"account-{number}@example.com",
+            "password": "benchmark",
+            "output_dir": os.path.join(workdir, f"account-{number}"),
+            "concurrency": args.concurrency,
+            "fake_orders": args.orders,
+            "fake_seed": number,
+            "page_latency": args.page_latency,
+        }
+        for number in range(args.accounts)
+    ]
+    server = StubLLMServer(latency=args.llm_latency).start()
+    try:
+        report = batch_runner.run_batch(
+            accounts,
+            max_browsers=args.max_browsers,
+            max_llm_in_flight=args.max_llm_in_flight,
+            llm_rate_limit=args.llm_rate_limit,
+            api_url=server.url,
+            worker=run_fake_account
+        )
+        report["stub_llm_calls"] = server.stats()["calls"]
+    finally:
+        server.stop()
+
+    for result in report["account_results"]:
+        result.pop("traceback", None)
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=4)
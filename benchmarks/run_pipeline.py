@@ -0,0 +1,180 @@
+"""Runs the Agent -> AmazonAuthenticator -> AmazonOrderFetcher pipeline offline.
+
+Pages come from FakeBrowser and every LLM call goes to the stub inference
+server, so nothing touches Amazon or Hugging Face:
+
+    python benchmarks/run_pipeline.py --orders 100 --llm-latency 0.2 --token-rate 40
+    python benchmarks/run_pipeline.py --orders 100 --concurrency 4 --unknown-layout-ratio 0.3
+    python benchmarks/run_pipeline.py --orders 100 --summary-mode
+    python benchmarks/run_pipeline.py --orders 100 --session-rerun
+
+Results are printed and written as JSON (see --output) for comparison between runs.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from agent import Agent
+from amazon_authenticator import AmazonAuthenticator
+from html_reducer import estimate_tokens
+from llm_interface import LLaMAModel
+from metrics import metrics
+from session_store import SessionStore
+from fake_browser import FakeSite, FakeBrowser
+from stub_llm_server import StubLLMServer
+
+
+class OfflineLLaMAModel(LLaMAModel):
+    # The real tokenizer is a Hub download; the estimate keeps the run offline
+    def count_tokens(self, text):
+        return estimate_tokens(text)
+
+
+def _llm_delta(before, after):
+    return {key: after[key] - before[key] for key in ("total_calls", "prompt_tokens", "completion_tokens", "busy_seconds")}
+
+
+def run_once(args, server, browsers, session_store):
+    """One Agent run from start-up to the last saved order, in the current directory."""
+    metrics.reset()
+    server.reset()
+    browsers.clear()
+    start = time.perf_counter()
+    agent = Agent(
+        llm_model=OfflineLLaMAModel(api_url=server.url),
+        concurrency=args.concurrency,
+        summary_mode=args.summary_mode,
+        include_items=args.include_items,
+        session_store=session_store
+    )
+    login_seconds = time.perf_counter() - start
+    login_llm = server.stats()
+    login_browser = sum(browser.page_load_seconds for browser in browsers)
+
+    fetch_start = time.perf_counter()
+    agent.fetch_order_details()
+    fetch_seconds = time.perf_counter() - fetch_start
+    total_seconds = time.perf_counter() - start
+    llm = server.stats()
+    orders = agent.order_fetcher.sink.records_written
+
+    fetch_llm = _llm_delta(login_llm, llm)
+    browser_seconds = sum(browser.page_load_seconds for browser in browsers)
+    return {
+        "orders": orders,
+        "orders_per_second": orders / fetch_seconds if fetch_seconds else 0.0,
+        "llm_calls_per_order": fetch_llm["total_calls"] / orders if orders else 0.0,
+        "prompt_tokens_per_order": fetch_llm["prompt_tokens"] / orders if orders else 0.0,
+        "session_restored": agent.session_restored,
+        "time_to_first_order_seconds": agent.time_to_first_order,
+        "llm_calls_by_kind": llm["calls"],
+        "extraction_paths": dict(agent.order_fetcher.order_extractor.stats),
+        "extraction_cache": agent.llm_model.extraction_cache.stats(),
+        "page_loads": sum(browser.page_loads for browser in browsers),
+        # busy_seconds and browser time are summed over concurrent requests and sessions
+        "stages": {
+            "login": {
+                "wall_seconds": login_seconds,
+                "llm_seconds": login_llm["busy_seconds"],
+                "browser_seconds": login_browser,
+                "llm_calls": login_llm["total_calls"],
+            },
+            "fetch": {
+                "wall_seconds": fetch_seconds,
+                "llm_seconds": fetch_llm["busy_seconds"],
+                "browser_seconds": browser_seconds - login_browser,
+                "llm_calls": fetch_llm["total_calls"],
+            },
+            "total_wall_seconds": total_seconds,
+        },
+        "metrics": {key: value for key, value in metrics.snapshot().items() if key != "spans"},
+    }
+
+
+def run(args):
+    site = FakeSite(args.orders, args.page_size, args.unknown_layout_ratio, args.seed)
+    server = StubLLMServer(latency=args.llm_latency, token_rate=args.token_rate).start()
+    browsers = []
+    browsers_lock = threading.Lock()
+
+    def create_driver(authenticator):
+        browser = FakeBrowser(site, page_latency=args.page_latency)
+        with browsers_lock:
+            browsers.append(browser)
+        return browser
+
+    original_create_driver = AmazonAuthenticator.create_driver
+    AmazonAuthenticator.create_driver = create_driver
+    os.environ.setdefault("AMAZON_EMAIL", "benchmark@example.com")
+    os.environ.setdefault("AMAZON_PASSWORD", "benchmark")
+    cwd = os.getcwd()
+    # Caches, index and order store land in a scratch directory unless --workdir reuses one
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="pipeline-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    session_store = None
+    if args.session_rerun:
+        session_store = SessionStore(path=os.path.join(workdir, "session.enc"), key=SessionStore.generate_key())
+    try:
+        os.chdir(workdir)
+        results = run_once(args, server, browsers, session_store)
+        if args.session_rerun:
+            # Same saved session, but a fresh index and order store so every order is fetched again
+            rerun_dir = os.path.join(workdir, "rerun")
+            os.makedirs(rerun_dir, exist_ok=True)
+            os.chdir(rerun_dir)
+            rerun = run_once(args, server, browsers, session_store)
+            results = {
+                "login": results,
+                "restored": rerun,
+                "time_to_first_order_speedup": (
+                    results["time_to_first_order_seconds"] / rerun["time_to_first_order_seconds"]
+                    if results["time_to_first_order_seconds"] and rerun["time_to_first_order_seconds"] else None
+                ),
+            }
+    finally:
+        os.chdir(cwd)
+        AmazonAuthenticator.create_driver = original_create_driver
+        server.stop()
+
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "workdir")},
+        **results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--unknown-layout-ratio", type=float, default=0.0,
+                        help="Share of detail pages no built-in rule understands")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--summary-mode", action="store_true", help="Read orders off the history pages")
+    parser.add_argument("--include-items", action="store_true", help="In summary mode, still open every detail page")
+    parser.add_argument("--page-latency", type=float, default=0.0, help="Seconds per simulated page load")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="Fixed seconds per LLM request")
+    parser.add_argument("--token-rate", type=float, help="Generated tokens per second of the stub model")
+    parser.add_argument("--session-rerun", action="store_true",
+                        help="Run twice, the second time restoring the session saved by the first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Reuse caches and the order index from a previous run")
+    parser.add_argument("--output", help="Result file (default: benchmarks/results/pipeline-<timestamp>.json)")
+    args = parser.parse_args()
+
+    results = run(args)
+    output = args.output or os.path.join(
+        REPO_ROOT, "benchmarks", "results", f"pipeline-{results['timestamp'].replace(':', '')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(results, file, indent=4)
+    print(json.dumps(results, indent=4))
+    print(f"Results written to {output}")
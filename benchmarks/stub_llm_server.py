@@ -0,0 +1,185 @@
+"""A local stand-in for the Hugging Face text-generation endpoint.
+
+Answers the agent's prompt templates deterministically from the HTML in the
+prompt and sleeps for `latency + output_tokens / token_rate` per request, so
+LLM cost can be dialled in without a real model. Completions longer than the
+request's max_new_tokens are cut off, as a real model's would be. GET /stats
+returns counters.
+
+    python benchmarks/stub_llm_server.py --port 8080 --latency 0.3 --token-rate 30
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_reducer import estimate_tokens
+from order_schema import compact_json
+
+_HTML_RE = re.compile(r"HTML:\s*```(.*)```", re.S)
+_DESCRIPTION_RE = re.compile(r"description:\s*```(.*?)```", re.S)
+_ORDER_ID_RE = re.compile(r"D01-\d{7}-\d{7}")
+_DATE_RE = re.compile(r"\d{4}-\d{1,2}-\d{1,2}")
+_PRICE_RE = re.compile(r"\$\d+\.\d{2}")
+
+# Element descriptions used by the authenticator and fetcher -> fake site selectors
+ELEMENT_SELECTORS = [
+    ("email", "#ap_email"),
+    ("password", "#ap_password"),
+    ("continue", "#continue"),
+    ("sign in", "#signInSubmit"),
+    ("returns & orders", "#nav-orders"),
+]
+
+
+def answer(prompt):
+    """Returns (kind, completion) for one of the agent's prompts."""
+    match = _HTML_RE.search(prompt)
+    html = match.group(1) if match else ""
+    if prompt.startswith("Extract the following information"):
+        from order_extractor import OrderExtractor
+        order_data, _ = OrderExtractor(None, rules_path=None).extract_with_rules(html)
+        if order_data is None:
+            # Unknown layout: pick out what a model would most plausibly find
+            ids, dates, prices = _ORDER_ID_RE.findall(html), _DATE_RE.findall(html), _PRICE_RE.findall(html)
+            order_data = {
+                "order_id": ids[0] if ids else "N/A",
+                "order_date": dates[0] if dates else "N/A",
+                "order_total": prices[0] if prices else "N/A",
+                "shipping_address": "N/A",
+                "delivery_status": "N/A",
+                "items": [],
+            }
+        return "extract_order_data", compact_json(order_data)
+    if prompt.startswith("Extract every order listed"):
+        from bs4 import BeautifulSoup
+        from order_extractor import parse_order_cards
+        summaries = []
+        for order_data, details_url, _ in parse_order_cards(BeautifulSoup(html, "html.parser")):
+            summary = {field: order_data[field] for field in ("order_id", "order_date", "order_total", "delivery_status")}
+            summaries.append({**summary, "details_url": details_url or "N/A"})
+        return "extract_order_summaries", json.dumps(summaries)
+    if prompt.startswith("Extract the URLs"):
+        return "get_order_details_urls", ", ".join(re.findall(r'href="([^"]*order-details[^"]*)"', html))
+    if prompt.startswith("Analyze this HTML content and return the CSS selector"):
+        return "find_next_page_element", "li.a-last a" if "a-last" in html else "NONE"
+    if prompt.startswith("Does this Amazon order history page"):
+        return "has_more_orders", "Yes" if "a-last" in html else "No"
+    description = _DESCRIPTION_RE.search(prompt)
+    description = description.group(1).lower() if description else ""
+    if prompt.startswith("Which of these page elements"):
+        # Candidate list from the DOM index: answer with the line of the expected element
+        wanted = [selector.lstrip("#") for keyword, selector in ELEMENT_SELECTORS if keyword in description]
+        if "next" in description:
+            wanted.append('text="Next"')
+        for line in prompt.splitlines():
+            match = re.match(r"\s*\[(\d+)\]", line)
+            if match and any(f'id="{value}"' in line or value in line for value in wanted):
+                return "choose_element", match.group(1)
+        return "choose_element", "NONE"
+    for keyword, selector in ELEMENT_SELECTORS:
+        if keyword in description:
+            return "find_element_by_description", selector
+    return "other", "NOT_FOUND"
+
+
+class StubLLMServer:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, token_rate=None):
+        self.latency = latency
+        self.token_rate = token_rate
+        self._lock = threading.Lock()
+        self.reset()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/generate"
+
+    def reset(self):
+        with self._lock:
+            self.calls = {}
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.truncated = 0
+            self.busy_seconds = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "total_calls": sum(self.calls.values()),
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "truncated": self.truncated,
+                "busy_seconds": self.busy_seconds,
+            }
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._send(stub.stats())
+
+            def do_POST(self):
+                start = time.perf_counter()
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                kind, completion = answer(request["inputs"])
+                completion_tokens = estimate_tokens(completion)
+                limit = request.get("parameters", {}).get("max_new_tokens")
+                truncated = bool(limit) and completion_tokens > limit
+                if truncated:
+                    completion = completion[:len(completion) * limit // completion_tokens]
+                    completion_tokens = limit
+                delay = stub.latency + (completion_tokens / stub.token_rate if stub.token_rate else 0.0)
+                if delay:
+                    time.sleep(delay)
+                with stub._lock:
+                    stub.calls[kind] = stub.calls.get(kind, 0) + 1
+                    stub.prompt_tokens += estimate_tokens(request["inputs"])
+                    stub.completion_tokens += completion_tokens
+                    stub.truncated += truncated
+                    stub.busy_seconds += time.perf_counter() - start
+                self._send([{"generated_text": completion}])
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="Fixed seconds per request")
+    parser.add_argument("--token-rate", type=float, help="Generated tokens per second")
+    args = parser.parse_args()
+    server = StubLLMServer(port=args.port, latency=args.latency, token_rate=args.token_rate)
+    print(f"Stub LLM server listening on {server.url}")
+    server.server.serve_forever()
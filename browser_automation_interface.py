@@ -1,4 +1,18 @@
+import time
+import logging
 from abc import ABC, abstractmethod
+from collections import deque
+from selenium.common.exceptions import JavascriptException, StaleElementReferenceException, TimeoutException
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+from metrics import metrics
+
+# Default upper bound for every wait; a wait that hits it raises TimeoutException
+DEFAULT_WAIT_TIMEOUT = 10
+# How long a click gets to start a navigation before it counts as an in-page update
+NAVIGATION_START_TIMEOUT = 1.0
+# Amazon sends signed-out visitors of account pages here
+SIGNIN_PATH = "/ap/signin"
 
 
 class BrowserAutomationInterface(ABC):
@@ -18,10 +32,52 @@ class BrowserAutomationInterface(ABC):
     def go_back(self):
         raise NotImplementedError
 
+    @abstractmethod
+    def get_current_url(self):
+        raise NotImplementedError
+
+    # Waits return as soon as their condition holds and raise TimeoutException otherwise
+    @abstractmethod
+    def wait_for_page_ready(self, timeout=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def wait_for_element(self, by, value, timeout=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def wait_for_url_change(self, old_url, timeout=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def wait_for_dom_quiet(self, quiet_period=0.5, timeout=None):
+        raise NotImplementedError
+
+    def wait_for_navigation(self, element, old_url, timeout=NAVIGATION_START_TIMEOUT):
+        """True once a click on `element` has started loading another page; never raises."""
+        return self.get_current_url() != old_url
+
+    def click_and_wait(self, element, timeout=None, dom_quiet=False):
+        """Clicks `element`, then waits for the resulting navigation or DOM update to settle.
+
+        A click that loads a new page is done once that page is ready; only a
+        click that updates the page in place, or `dom_quiet=True`, also waits
+        for the DOM to stop changing.
+        """
+        old_url = self.get_current_url()
+        element.click()
+        if not self.wait_for_navigation(element, old_url) or dom_quiet:
+            self.wait_for_dom_quiet(timeout=timeout)
+        self.wait_for_page_ready(timeout)
+
 
 class SeleniumAdapter(BrowserAutomationInterface):
-    def __init__(self, driver):
+    def __init__(self, driver, wait_timeout=DEFAULT_WAIT_TIMEOUT, poll_interval=0.1):
         self.driver = driver
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        # (wait kind, seconds actually spent) for the most recent waits
+        self.wait_timings = deque(maxlen=1000)
 
     def get_page_source(self):
         return self.driver.page_source
@@ -30,10 +86,97 @@ class SeleniumAdapter(BrowserAutomationInterface):
         return self.driver.find_element(by, value)
 
     def navigate_to(self, url):
-        self.driver.get(url)
+        with metrics.timer("browser_navigation_seconds", action="navigate"):
+            self.driver.get(url)
 
     def go_back(self):
-        self.driver.back()
+        with metrics.timer("browser_navigation_seconds", action="back"):
+            self.driver.back()
+
+    def get_current_url(self):
+        return self.driver.current_url
+
+    def get_cookies(self):
+        return self.driver.get_cookies()
+
+    def add_cookie(self, cookie):
+        self.driver.add_cookie(cookie)
+
+    def delete_all_cookies(self):
+        self.driver.delete_all_cookies()
+
+    def execute_script(self, script, *args):
+        return self.driver.execute_script(script, *args)
+
+    def get_storage(self, kind="localStorage"):
+        """Returns the current origin's localStorage or sessionStorage as a dict."""
+        return self.driver.execute_script(f"return Object.assign({{}}, window.{kind});") or {}
+
+    def set_storage(self, items, kind="localStorage"):
+        self.driver.execute_script(
+            f"for (const [key, value] of Object.entries(arguments[0])) {{ window.{kind}.setItem(key, value); }}", items
+        )
+
+    def clear_storage(self, kind="localStorage"):
+        self.driver.execute_script(f"window.{kind}.clear();")
+
+    def _wait(self, kind, condition, timeout, ignored_exceptions=None):
+        start = time.perf_counter()
+        try:
+            wait = WebDriverWait(
+                self.driver,
+                timeout or self.wait_timeout,
+                poll_frequency=self.poll_interval,
+                ignored_exceptions=ignored_exceptions
+            )
+            return wait.until(condition)
+        except TimeoutException:
+            metrics.inc("browser_wait_timeouts_total", kind=kind)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.wait_timings.append((kind, elapsed))
+            metrics.observe("browser_wait_seconds", elapsed, kind=kind)
+            logging.debug(f"Waited {elapsed:.3f}s for {kind}")
+
+    def wait_for_page_ready(self, timeout=None):
+        return self._wait(
+            "page_ready",
+            lambda driver: driver.execute_script("return document.readyState") == "complete",
+            timeout
+        )
+
+    def wait_for_element(self, by, value, timeout=None):
+        return self._wait("element", EC.presence_of_element_located((by, value)), timeout)
+
+    def wait_for_url_change(self, old_url, timeout=None):
+        return self._wait("url_change", EC.url_changes(old_url), timeout)
+
+    def wait_for_navigation(self, element, old_url, timeout=NAVIGATION_START_TIMEOUT):
+        # A new document detaches the clicked element; pushState-style navigations only change the URL
+        started = EC.any_of(EC.staleness_of(element), EC.url_changes(old_url))
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=self.poll_interval).until(started)
+            return True
+        except TimeoutException:
+            return False
+
+    def wait_for_dom_quiet(self, quiet_period=0.5, timeout=None):
+        # The DOM counts as quiet once its size has not changed for `quiet_period` seconds
+        state = {"size": None, "since": time.perf_counter()}
+
+        def dom_is_quiet(driver):
+            size = driver.execute_script(
+                "return [document.getElementsByTagName('*').length, document.body ? document.body.innerHTML.length : 0]"
+            )
+            now = time.perf_counter()
+            if size != state["size"]:
+                state["size"], state["since"] = size, now
+                return False
+            return now - state["since"] >= quiet_period
+
+        # Scripts fail while a navigation swaps the document; that just means "not quiet yet"
+        return self._wait("dom_quiet", dom_is_quiet, timeout, ignored_exceptions=(JavascriptException, StaleElementReferenceException))
 
     def quit(self):
-        self.driver.quit()
\ No newline at end of file
+        self.driver.quit()
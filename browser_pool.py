@@ -0,0 +1,52 @@
+import queue
+import logging
+import threading
+
+
+class BrowserPool:
+    """A fixed set of browser sessions that share the cookies of an authenticated driver.
+
+    `driver_factory` returns a new BrowserAutomationInterface; sessions are
+    created lazily on first checkout and reused until `close` is called.
+    """
+
+    def __init__(self, driver_factory, source_driver, size, cookie_url="https://www.amazon.com"):
+        self.driver_factory = driver_factory
+        self.source_driver = source_driver
+        self.size = size
+        self.cookie_url = cookie_url
+        self._idle = queue.Queue()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def _new_session(self):
+        session = self.driver_factory()
+        # Without a cookie_url the factory's sessions already carry the cookies
+        if self.cookie_url:
+            # Cookies can only be set for the domain the session is currently on
+            session.navigate_to(self.cookie_url)
+            for cookie in self.source_driver.get_cookies():
+                session.add_cookie(cookie)
+        logging.info(f"Opened pooled browser session {len(self._sessions) + 1}/{self.size}")
+        return session
+
+    def acquire(self):
+        with self._lock:
+            if self._idle.empty() and len(self._sessions) < self.size:
+                session = self._new_session()
+                self._sessions.append(session)
+                return session
+        return self._idle.get()
+
+    def release(self, session):
+        self._idle.put(session)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions:
+                try:
+                    session.quit()
+                except Exception as e:
+                    logging.warning(f"Error closing pooled browser session: {e}")
+            self._sessions = []
+            self._idle = queue.Queue()
@@ -0,0 +1,205 @@
+import re
+from collections import Counter, namedtuple
+from bs4 import BeautifulSoup
+
+# Everything a user can click, type into or select
+INTERACTIVE_SELECTOR = (
+    "a[href], button, input, select, textarea, summary, "
+    "[role=button], [role=link], [role=menuitem], [role=tab], [role=checkbox], [onclick]"
+)
+CANDIDATE_LIMIT = 8
+# Below this score nothing on the page resembles the description
+MIN_SCORE = 0.15
+# A runner-up scoring at least this share of the top match makes the lookup ambiguous
+AMBIGUITY_RATIO = 0.75
+MAX_TEXT_LENGTH = 80
+
+# Words that describe the lookup rather than the element
+STOPWORDS = {
+    "a", "an", "the", "to", "of", "on", "in", "for", "and", "or", "that", "this", "which", "where", "with",
+    "you", "your", "find", "locate", "click", "enter", "says", "say", "labeled", "labelled", "called",
+    "displays", "display", "shows", "show", "page", "amazon", "element", "button", "link", "input", "field",
+    "box", "text", "it", "is", "into", "goes", "go", "takes", "take", "current",
+}
+# Description words that name a kind of element, and the kinds they mean
+KIND_HINTS = {
+    "button": "button", "buttons": "button",
+    "link": "link", "links": "link",
+    "input": "input", "field": "input", "textbox": "input", "box": "input",
+}
+KIND_BONUS = 0.25
+# Elements of another kind than the description asks for keep this share of their score
+KIND_MISMATCH_FACTOR = 0.5
+QUOTED_EXACT_BONUS = 1.0
+QUOTED_PARTIAL_BONUS = 0.5
+# How much a description word counts when it matches each part of an element
+FIELD_WEIGHTS = {"text": 1.0, "aria_label": 1.0, "id": 0.8, "name": 0.8, "type": 0.6}
+
+# "... on the Amazon sign-in page" says where to look, not what to look for
+_CONTEXT_RE = re.compile(r"\bon (?:the )?[\w\s'&-]*?\bpage\b", re.I)
+_QUOTED_RE = re.compile(r"""["'‘’“”]([^"'‘’“”]+)["'‘’“”]""")
+_CAMEL_RE = re.compile(r"([a-z])([A-Z])")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SIMPLE_ID_RE = re.compile(r"^[A-Za-z][\w-]*$")
+
+InteractiveElement = namedtuple(
+    "InteractiveElement", ["tag", "id", "name", "role", "type", "text", "aria_label", "selector"]
+)
+
+
+def _words(value):
+    words = set()
+    for word in _WORD_RE.findall(_CAMEL_RE.sub(r"\1 \2", value or "").lower()):
+        # Crude stemming so "orders" matches "order"
+        words.add(word[:-1] if len(word) > 3 and word.endswith("s") else word)
+    return words
+
+
+# Stopwords normalized the same way as description words
+_STOPWORDS = _words(" ".join(STOPWORDS))
+
+
+def _is_hidden(tag):
+    if tag.name == "input" and (tag.get("type") or "").lower() == "hidden":
+        return True
+    for node in [tag, *tag.parents]:
+        if node.name is None:
+            continue
+        style = (node.get("style") or "").replace(" ", "").lower()
+        if node.has_attr("hidden") or node.get("aria-hidden") == "true" or "display:none" in style:
+            return True
+    return False
+
+
+def _kind(element):
+    if element.tag == "a" or element.role == "link":
+        return "link"
+    if element.tag == "button" or element.role == "button" or element.type in ("submit", "button", "image", "reset"):
+        return "button"
+    if element.tag in ("input", "textarea", "select"):
+        return "input"
+    return element.role or element.tag
+
+
+def _quote(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _attribute_counts(soup):
+    """How often each (tag, attribute, value) occurs, so uniqueness checks need no re-scan."""
+    counts = Counter()
+    for tag in soup.find_all(True):
+        for attribute in ("id", "name", "aria-label", "href"):
+            value = tag.get(attribute)
+            if isinstance(value, str) and value:
+                counts[("*" if attribute == "id" else tag.name, attribute, value)] += 1
+    return counts
+
+
+def stable_selector(tag, counts):
+    """A CSS selector unique on the page, preferring ids and names over positions."""
+    if tag.get("id") and counts[("*", "id", tag["id"])] == 1:
+        return f"#{tag['id']}" if _SIMPLE_ID_RE.match(tag["id"]) else f'[id="{_quote(tag["id"])}"]'
+    for attribute in ("name", "aria-label", "href"):
+        value = tag.get(attribute)
+        if isinstance(value, str) and value and counts[(tag.name, attribute, value)] == 1:
+            return f'{tag.name}[{attribute}="{_quote(value)}"]'
+
+    parts, node = [], tag
+    while node is not None and node.name not in (None, "[document]", "html"):
+        node_id = node.get("id")
+        if node_id and _SIMPLE_ID_RE.match(node_id) and counts[("*", "id", node_id)] == 1:
+            parts.append(f"#{node_id}")
+            break
+        position = 1 + sum(1 for _ in node.find_previous_siblings(node.name))
+        parts.append(f"{node.name}:nth-of-type({position})")
+        node = node.parent
+    return " > ".join(reversed(parts))
+
+
+class DOMIndex:
+    """A compact table of the interactive elements on a page.
+
+    `rank` scores elements against a natural-language description locally;
+    `describe` renders a short candidate list for the LLM when the ranking
+    alone is not conclusive.
+    """
+
+    def __init__(self, html_content):
+        soup = BeautifulSoup(html_content or "", "html.parser")
+        counts = _attribute_counts(soup)
+        self.elements = []
+        for tag in soup.select(INTERACTIVE_SELECTOR):
+            if _is_hidden(tag):
+                continue
+            text = tag.get_text(" ", strip=True)
+            if tag.name in ("input", "textarea"):
+                text = " ".join(filter(None, [tag.get("value"), tag.get("placeholder"), tag.get("title")]))
+            if not text and tag.get("aria-labelledby"):
+                # Amazon labels its submit inputs through a separate span
+                labels = (soup.find(id=label_id) for label_id in tag["aria-labelledby"].split())
+                text = " ".join(label.get_text(" ", strip=True) for label in labels if label is not None)
+            self.elements.append(InteractiveElement(
+                tag=tag.name,
+                id=tag.get("id") or "",
+                name=tag.get("name") or "",
+                role=tag.get("role") or "",
+                type=(tag.get("type") or "").lower(),
+                text=text[:MAX_TEXT_LENGTH],
+                aria_label=(tag.get("aria-label") or "")[:MAX_TEXT_LENGTH],
+                selector=stable_selector(tag, counts)
+            ))
+        self._words = [
+            {field: _words(getattr(element, field)) for field in FIELD_WEIGHTS}
+            for element in self.elements
+        ]
+
+    def score(self, index, description):
+        element, fields = self.elements[index], self._words[index]
+        description = _CONTEXT_RE.sub(" ", description)
+        words = _words(description) - _STOPWORDS
+        score = 0.0
+        if words:
+            matched = sum(
+                max((weight for field, weight in FIELD_WEIGHTS.items() if word in fields[field]), default=0.0)
+                for word in words
+            )
+            score = matched / len(words)
+        labels = [label.lower() for label in (element.text, element.aria_label) if label]
+        for phrase in _QUOTED_RE.findall(description):
+            phrase = phrase.strip().lower()
+            if any(label == phrase for label in labels):
+                score += QUOTED_EXACT_BONUS
+            elif any(phrase in label for label in labels):
+                score += QUOTED_PARTIAL_BONUS
+        # The kind of element only breaks ties; on its own it is no evidence of a match
+        kinds = {KIND_HINTS[word] for word in _WORD_RE.findall(description.lower()) if word in KIND_HINTS}
+        if kinds and score > 0:
+            score = score + KIND_BONUS if _kind(element) in kinds else score * KIND_MISMATCH_FACTOR
+        return score
+
+    def rank(self, description, limit=CANDIDATE_LIMIT):
+        """Returns up to `limit` (score, element) pairs, best first."""
+        scored = [(self.score(index, description), element) for index, element in enumerate(self.elements)]
+        scored.sort(key=lambda pair: -pair[0])
+        return scored[:limit]
+
+    @staticmethod
+    def is_confident(ranked):
+        """True when the top match is plausible and clearly ahead of the runner-up."""
+        if not ranked or ranked[0][0] < MIN_SCORE:
+            return False
+        return len(ranked) == 1 or ranked[1][0] < ranked[0][0] * AMBIGUITY_RATIO
+
+    @staticmethod
+    def describe(elements):
+        """One numbered line per element, for the candidate prompt."""
+        lines = []
+        for number, element in enumerate(elements):
+            attributes = [
+                f'{field}="{getattr(element, field)}"'
+                for field in ("id", "name", "role", "type", "text", "aria_label")
+                if getattr(element, field)
+            ]
+            lines.append(f"[{number}] <{element.tag}> {' '.join(attributes)}")
+        return "\n".join(lines)
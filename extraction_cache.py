@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import time
+import gzip
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+
+
+def cache_key(*parts):
+    return hashlib.sha256("\0".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """On-disk memo of LLM outputs with size-bounded LRU eviction.
+
+    Keys are built by the caller (see `cache_key`) from the reduced input, the
+    prompt template version and the model identity; values are raw LLM outputs.
+    """
+
+    def __init__(self, path="extraction_cache.sqlite3", max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT, size INTEGER, last_access REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, key):
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key, value):
+        size = len(value.encode("utf-8"))
+        with self._lock, self._conn:
+            previous = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time())
+            )
+            self._total_bytes += size - (previous[0] if previous else 0)
+            self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries in small batches until back under the bound
+        while self._total_bytes > self.max_bytes:
+            victims = self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not victims:
+                break
+            evicted = []
+            for key, size in victims:
+                if self._total_bytes <= self.max_bytes:
+                    break
+                evicted.append((key,))
+                self._total_bytes -= size
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", evicted)
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": self._total_bytes,
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+def _iter_html_files(directory):
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.endswith(".html") or name.endswith(".html.gz"):
+                yield os.path.join(root, name)
+
+
+def _read_html(path):
+    if path.endswith(".gz"):
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            return file.read()
+    with open(path, 'r', encoding='utf-8') as file:
+        return file.read()
+
+
+def reextract_directory(llm_model, html_dir="order_html", output_dir="order_json_reextracted", batch_size=16):
+    """Re-runs LLM extraction over every saved page in `html_dir`.
+
+    Pages whose reduced HTML, prompt template and model are unchanged are
+    served from the model's extraction cache, so only edited prompts or new
+    pages cost an LLM call. Returns the cache statistics.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = list(_iter_html_files(html_dir))
+    for start in range(0, len(paths), batch_size):
+        batch = paths[start:start + batch_size]
+        results = llm_model.extract_order_data_batch([_read_html(path) for path in batch])
+        for path, order_json in zip(batch, results):
+            name = os.path.basename(path).split(".html")[0]
+            with open(os.path.join(output_dir, f"{name}.json"), 'w', encoding='utf-8') as file:
+                json.dump(order_json, file, indent=4)
+        logging.info(f"Re-extracted {min(start + batch_size, len(paths))}/{len(paths)} pages")
+    return llm_model.extraction_cache.stats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-extract saved order pages through the extraction cache")
+    parser.add_argument("html_dir", nargs="?", default="order_html")
+    parser.add_argument("--output", default="order_json_reextracted")
+    parser.add_argument("--batch-size", type=int, default=16)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+    from llm_interface import LLaMAModel
+    print(json.dumps(reextract_directory(LLaMAModel(), args.html_dir, args.output, args.batch_size), indent=4))
@@ -0,0 +1,143 @@
+import re
+import logging
+from collections import namedtuple
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+
+# Nodes that never carry order data or navigation targets
+NON_CONTENT_TAGS = ["script", "style", "noscript", "svg", "iframe", "link", "meta", "template", "canvas"]
+
+# Attributes the LLM needs to build selectors and read links; everything else
+# (inline styles, event handlers, data-* tracking payloads) is dropped
+KEEP_ATTRIBUTES = {"id", "class", "href", "name", "type", "role", "aria-label", "placeholder", "value", "for", "title", "alt"}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+ReductionReport = namedtuple("ReductionReport", ["bytes_in", "bytes_out", "tokens_in", "tokens_out", "chunks"])
+
+
+def estimate_tokens(text):
+    # Rough LLaMA ratio for markup; only used when no tokenizer is supplied
+    return len(text) // 4 + 1
+
+
+def strip_non_content(soup):
+    for tag in soup.find_all(NON_CONTENT_TAGS):
+        tag.decompose()
+    for comment in soup.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+    return soup
+
+
+def strip_attributes(soup):
+    for tag in soup.find_all(True):
+        tag.attrs = {name: value for name, value in tag.attrs.items() if name in KEEP_ATTRIBUTES}
+    return soup
+
+
+def collapse_whitespace(soup):
+    for text in soup.find_all(string=True):
+        collapsed = _WHITESPACE_RE.sub(" ", text)
+        if not collapsed.strip():
+            text.extract()
+        elif collapsed != text:
+            text.replace_with(NavigableString(collapsed))
+    return soup
+
+
+def select_subtree(selectors):
+    """Builds a stage that keeps only the first element matching one of `selectors`.
+
+    The page is left untouched when none of the selectors match, so a layout
+    change degrades to a bigger prompt rather than an empty one.
+    """
+    def stage(soup):
+        for selector in selectors:
+            element = soup.select_one(selector)
+            if element is not None:
+                return BeautifulSoup(str(element), "html.parser")
+        return soup
+    return stage
+
+
+DEFAULT_STAGES = [strip_non_content, strip_attributes, collapse_whitespace]
+
+
+class HTMLReducer:
+    """Shrinks page HTML before it is placed into an LLM prompt.
+
+    Each stage is a callable taking and returning a BeautifulSoup document,
+    so callers can add, remove or reorder stages freely.
+    """
+
+    def __init__(self, stages=None, token_counter=None):
+        self.stages = list(DEFAULT_STAGES if stages is None else stages)
+        self.count_tokens = token_counter or estimate_tokens
+        self.bytes_saved = 0
+        self.tokens_saved = 0
+
+    def reduce(self, html_content, subtree_selectors=None):
+        soup = BeautifulSoup(html_content or "", "html.parser")
+        stages = list(self.stages)
+        if subtree_selectors:
+            # Carve out the subtree first so the other stages only walk what is kept
+            stages.insert(0, select_subtree(subtree_selectors))
+        for stage in stages:
+            soup = stage(soup)
+        return str(soup).strip()
+
+    def chunk(self, html_content, max_tokens):
+        """Splits reduced HTML into pieces of at most `max_tokens` tokens.
+
+        Splits happen on element boundaries where possible; only a single text
+        node that is larger than the budget is cut mid-string.
+        """
+        if self.count_tokens(html_content) <= max_tokens:
+            return [html_content]
+
+        soup = BeautifulSoup(html_content, "html.parser")
+        chunks, current, current_tokens = [], [], 0
+        for piece, piece_tokens in self._split(soup, max_tokens):
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append("".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+        if current:
+            chunks.append("".join(current))
+        return chunks
+
+    def _split(self, node, max_tokens):
+        for child in node.children:
+            text = str(child)
+            tokens = self.count_tokens(text)
+            if tokens <= max_tokens:
+                yield text, tokens
+            elif isinstance(child, Tag) and child.contents:
+                yield from self._split(child, max_tokens)
+            else:
+                # Oversized leaf: cut proportionally to its token density
+                step = max(1, len(text) * max_tokens // tokens)
+                for start in range(0, len(text), step):
+                    piece = text[start:start + step]
+                    yield piece, self.count_tokens(piece)
+
+    def prepare(self, html_content, max_tokens, subtree_selectors=None):
+        """Reduces `html_content` and returns (chunks, ReductionReport)."""
+        reduced = self.reduce(html_content, subtree_selectors)
+        chunks = self.chunk(reduced, max_tokens)
+
+        html_content = html_content or ""
+        report = ReductionReport(
+            bytes_in=len(html_content.encode("utf-8")),
+            bytes_out=len(reduced.encode("utf-8")),
+            tokens_in=self.count_tokens(html_content),
+            tokens_out=sum(self.count_tokens(chunk) for chunk in chunks),
+            chunks=len(chunks),
+        )
+        self.bytes_saved += report.bytes_in - report.bytes_out
+        self.tokens_saved += report.tokens_in - report.tokens_out
+        logging.info(
+            f"Reduced HTML {report.bytes_in} -> {report.bytes_out} bytes, "
+            f"{report.tokens_in} -> {report.tokens_out} tokens in {report.chunks} chunk(s)"
+        )
+        return chunks, report
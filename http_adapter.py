@@ -0,0 +1,135 @@
+import logging
+from collections import deque
+from urllib.parse import urljoin, urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from selenium.common.exceptions import NoSuchElementException, WebDriverException
+from browser_automation_interface import BrowserAutomationInterface, SIGNIN_PATH
+from metrics import metrics, SIZE_BUCKETS
+
+DEFAULT_TIMEOUT = 30
+# urllib3 advertises (and decodes) "br" only when brotli or brotlicffi is installed
+BROWSER_HEADERS = {
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Encoding": ACCEPT_ENCODING,
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+class PageFetchError(WebDriverException):
+    """A page could not be loaded over HTTP, or Amazon wanted a fresh sign-in for it."""
+
+
+def create_http_session(driver=None, pool_size=4):
+    """A keep-alive requests session that presents itself like `driver`.
+
+    Cookies and the user agent are copied from the authenticated browser so
+    Amazon serves the same pages it would render in Chrome.
+    """
+    session = requests.Session()
+    session.headers.update(BROWSER_HEADERS)
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if driver is not None:
+        if hasattr(driver, "execute_script"):
+            session.headers["User-Agent"] = driver.execute_script("return navigator.userAgent")
+        for cookie in driver.get_cookies():
+            session.cookies.set(
+                cookie["name"],
+                cookie["value"],
+                domain=cookie.get("domain", ""),
+                path=cookie.get("path", "/"),
+                secure=cookie.get("secure", False),
+                expires=cookie.get("expiry")
+            )
+    return session
+
+
+class HTTPPageAdapter(BrowserAutomationInterface):
+    """Loads read-only, server-rendered pages without a browser.
+
+    Only navigation and page source are real: pages are fetched with one GET
+    and never run scripts, so waits return immediately and there are no
+    elements to interact with. Adapters may share one session and its
+    connection pool across threads.
+    """
+
+    def __init__(self, session=None, timeout=DEFAULT_TIMEOUT):
+        # A session passed in belongs to the caller, who closes it
+        self.owns_session = session is None
+        self.session = session or create_http_session()
+        self.timeout = timeout
+        self.url = None
+        self.history = deque(maxlen=50)
+        self._page_source = ""
+
+    @classmethod
+    def from_driver(cls, driver, pool_size=4, timeout=DEFAULT_TIMEOUT):
+        adapter = cls(create_http_session(driver, pool_size), timeout)
+        adapter.owns_session = True
+        return adapter
+
+    def get_page_source(self):
+        return self._page_source
+
+    def find_element(self, by, value):
+        raise NoSuchElementException("HTTPPageAdapter serves read-only pages; use the browser to interact")
+
+    def _get(self, url):
+        url = urljoin(self.url or "", url)
+        with metrics.timer("browser_navigation_seconds", action="http_get"):
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                raise PageFetchError(f"GET {url} failed: {e}") from e
+        if SIGNIN_PATH in urlparse(response.url).path:
+            raise PageFetchError(f"GET {url} was redirected to sign-in; the session cookies were not accepted")
+        if response.status_code >= 400:
+            raise PageFetchError(f"GET {url} returned {response.status_code}")
+        metrics.observe("http_page_bytes", len(response.content), buckets=SIZE_BUCKETS)
+        logging.debug(f"Fetched {response.url} ({response.headers.get('Content-Encoding', 'identity')})")
+        self.url = response.url
+        self._page_source = response.text
+
+    def navigate_to(self, url):
+        previous = self.url
+        self._get(url)
+        if previous:
+            self.history.append(previous)
+
+    def go_back(self):
+        if self.history:
+            self._get(self.history.pop())
+
+    def get_current_url(self):
+        return self.url
+
+    def get_cookies(self):
+        return [
+            {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path, "secure": c.secure, "expiry": c.expires}
+            for c in self.session.cookies
+        ]
+
+    def add_cookie(self, cookie):
+        self.session.cookies.set(
+            cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/")
+        )
+
+    # The page is complete once the response body has been read
+    def wait_for_page_ready(self, timeout=None):
+        return True
+
+    def wait_for_element(self, by, value, timeout=None):
+        return self.find_element(by, value)
+
+    def wait_for_url_change(self, old_url, timeout=None):
+        return self.url != old_url
+
+    def wait_for_dom_quiet(self, quiet_period=0.5, timeout=None):
+        return True
+
+    def quit(self):
+        if self.owns_session:
+            self.session.close()
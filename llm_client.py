@@ -0,0 +1,124 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from metrics import metrics
+
+# Responses worth retrying: rate limiting, model still loading, transient upstream errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Blocking token-bucket rate limiter: `rate` requests per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class LLMClient:
+    """Pooled HTTP client for a text-generation inference endpoint.
+
+    Keeps connections alive across calls, caps the number of requests in
+    flight, optionally rate-limits with a token bucket and retries transient
+    failures with jittered exponential backoff. `generate_batch` and the
+    async variants submit many prompts at once and return results in order.
+    """
+
+    def __init__(
+        self,
+        api_url,
+        headers=None,
+        max_in_flight=4,
+        rate_limit=None,
+        max_retries=5,
+        backoff_base=1.0,
+        backoff_max=30.0,
+        timeout=120
+    ):
+        self.api_url = api_url
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.rate_limiter = TokenBucket(rate_limit) if rate_limit else None
+
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._executor = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="llm")
+
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            # Honour the server's hint, but never let one header stall a worker for long
+            return min(float(retry_after), self.backoff_max)
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def generate(self, prompt, max_tokens=200, **parameters):
+        data = {
+            "inputs": prompt,
+            "parameters": {"max_new_tokens": max_tokens, **parameters}
+        }
+        attempt = 0
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            response = None
+            with self._slots:
+                try:
+                    with metrics.timer("llm_request_seconds"):
+                        response = self.session.post(self.api_url, json=data, timeout=self.timeout)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    metrics.inc("llm_retries_total", reason=type(e).__name__)
+                    logging.warning(f"LLM request failed ({e}); retry {attempt + 1}/{self.max_retries}")
+            if response is not None:
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    response.raise_for_status()  # Raise an exception for bad responses
+                    return response.json()[0]['generated_text']
+                metrics.inc("llm_retries_total", reason=str(response.status_code))
+                logging.warning(f"LLM returned {response.status_code}; retry {attempt + 1}/{self.max_retries}")
+            time.sleep(self._backoff(attempt, response))
+            attempt += 1
+
+    def generate_batch(self, prompts, max_tokens=200, **parameters):
+        """Runs all `prompts` concurrently (bounded by max_in_flight) and returns outputs in order."""
+        return list(self._executor.map(lambda prompt: self.generate(prompt, max_tokens, **parameters), prompts))
+
+    async def agenerate(self, prompt, max_tokens=200, **parameters):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: self.generate(prompt, max_tokens, **parameters))
+
+    async def agenerate_batch(self, prompts, max_tokens=200, **parameters):
+        return await asyncio.gather(*(self.agenerate(prompt, max_tokens, **parameters) for prompt in prompts))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
@@ -1,19 +1,133 @@
 import os
-import requests
 import json
+import hashlib
 import logging
-import pandas as pd
+import threading
 from abc import ABC, abstractmethod
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
-from datasets import load_dataset, Dataset
-from transformers import (
-    TrainingArguments,
-    AutoTokenizer,
-    AutoModelForCausalLM
-)
-from trl import SFTTrainer
 from amazon_data_generator import AmazonOrderDataGenerator
+from selector_cache import SelectorCache, page_fingerprint
+from dom_index import DOMIndex, MIN_SCORE
+from html_reducer import HTMLReducer
+from llm_client import LLMClient
+from extraction_cache import ExtractionCache, cache_key
+from metrics import metrics, SIZE_BUCKETS
+from order_schema import ORDER_JSON_SCHEMA, is_complete_order_output, order_token_budget, parse_order_output
+
+DEFAULT_API_URL = "https://api-inference.huggingface.co/models/meta-llama/Llama-2-7b-chat-hf"
+# Llama-2 context window; prompts plus generated tokens must fit inside it
+MAX_CONTEXT_TOKENS = 4096
+
+# Subtrees that hold everything the corresponding prompt needs
+ORDER_DETAILS_SELECTORS = ["#orderDetails", ".order-details-section", "#orderDetailsTable", "#ordersInPackage-container"]
+ORDER_HISTORY_SELECTORS = ["#ordersContainer", "#yourOrdersContent", ".your-orders-content-container"]
+
+ORDER_DATA_PROMPT = """Extract the following information from this Amazon order confirmation HTML as compact JSON on a single line, using these short keys:
+
+        i: order ID, d: order date, t: order total, a: shipping address, s: delivery status,
+        it: list of items, each with n: name, q: quantity (a number), p: price
+
+        {{"i":"","d":"","t":"","a":"","s":"","it":[{{"n":"","q":0,"p":""}}]}}
+
+        Replace the empty string values ("") and the 0 with the corresponding data from the HTML. If a piece of information is not present in the HTML, fill the corresponding value with "N/A".
+
+        HTML:
+        ```
+        {html_content}
+        ```
+        JSON:
+        """
+
+ORDER_URLS_PROMPT = """Extract the URLs for each order details page from this Amazon order history page HTML.
+
+        HTML:
+        ```
+        {html_content}
+        ```
+        URLs (comma-separated):"""
+
+ORDER_SUMMARIES_PROMPT = """Extract every order listed on this Amazon order history page HTML as a JSON array, one object per order:
+
+        [
+            {{
+                "order_id": "",
+                "order_date": "",
+                "order_total": "",
+                "delivery_status": "",
+                "details_url": ""
+            }}
+        ]
+
+        Replace the empty string values ("") and the 0 with the corresponding data from the HTML. If a piece of information is not present in the HTML, fill the corresponding value with "N/A".
+
+        HTML:
+        ```
+        {html_content}
+        ```
+        JSON:
+        """
+
+# Generated tokens per extracted order
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048)
+
+# A whole page of orders comes back at once, so it needs a larger generation budget
+ORDER_SUMMARIES_MAX_TOKENS = 1024
+
+ELEMENT_PROMPT = """Analyze the current page HTML and find the element that best matches the following description:
+
+        ```
+        {element_description}
+        ```
+        
+        If multiple elements match the description, prioritize interactive elements like buttons, links, or input fields. Return the CSS selector for this element. If no element is found, return "NOT_FOUND".
+
+        HTML:
+        ```
+        {html_content}
+        ```
+
+        CSS Selector:"""
+
+ELEMENT_CANDIDATES_PROMPT = """Which of these page elements best matches the following description?
+
+        ```
+        {element_description}
+        ```
+
+        Elements:
+        {candidates}
+
+        Answer with the number of the element only. If none of them matches, answer "NONE".
+        Answer:"""
+
+# What the fetcher looks for on order history pages
+NEXT_PAGE_DESCRIPTION = 'Find the "Next" link that goes to the next page'
+
+HAS_MORE_ORDERS_PROMPT = """Does this Amazon order history page contain a "Next Page" button? 
+
+        HTML:
+        ```
+        {html_content}
+        ```
+        Answer (Yes/No):"""
+
+
+def template_version(prompt_template):
+    """Identifies a prompt template revision; editing a template invalidates its cached outputs."""
+    return hashlib.sha256(prompt_template.encode("utf-8")).hexdigest()[:12]
+
+
+def prompt_prefix(prompt_template):
+    """Returns the fixed instruction text a template puts before the page HTML."""
+    return prompt_template.split("{html_content}")[0].format()
+
+
+def _is_json_list(text):
+    try:
+        return isinstance(json.loads(text), list)
+    except json.JSONDecodeError:
+        return False
 
 
 class LLMInterface(ABC):
@@ -25,14 +139,27 @@ class LLMInterface(ABC):
         raise NotImplementedError
 
     @abstractmethod
-    def _call_llm(self, prompt, max_tokens=200):
+    # `schema` is a JSON schema the answer must follow; backends that can constrain decoding use it
+    def _call_llm(self, prompt, max_tokens=200, schema=None):
         raise NotImplementedError
 
+    # Backends that can run prompts concurrently override this
+    def _call_llm_batch(self, prompts, max_tokens=200, schema=None):
+        return [self._call_llm(prompt, max_tokens, schema) for prompt in prompts]
+
     # Data extraction method moved to subclass
     @abstractmethod
     def extract_order_data(self, html_content):
         raise NotImplementedError
 
+    def extract_order_data_batch(self, html_contents):
+        return [self.extract_order_data(html_content) for html_content in html_contents]
+
+    # Method for reading every order card of a history page moved to subclass
+    @abstractmethod
+    def extract_order_summaries(self, html_content):
+        raise NotImplementedError
+
     # Method for getting next page CSS selector moved to subclass
     @abstractmethod
     def find_next_page_element(self, html_content, driver):
@@ -55,12 +182,44 @@ class LLMInterface(ABC):
 
 
 class LLaMAModel(LLMInterface):
-    def __init__(self, api_url="https://api-inference.huggingface.co/models/meta-llama/Llama-2-7b-chat-hf"):
+    # Label on the LLM metrics; subclasses running elsewhere override it
+    backend = "http"
+
+    def __init__(self, api_url=DEFAULT_API_URL, selector_cache=None, html_reducer=None, llm_client=None, extraction_cache=None, json_grammar=False):
         self.api_url = api_url
+        # Send the answer's JSON schema as a TGI `grammar` parameter; only for endpoints that support it
+        self.json_grammar = json_grammar
+        self.selector_cache = selector_cache if selector_cache is not None else SelectorCache()
         self.headers = {"Authorization": f"Bearer {os.environ.get('HUGGINGFACE_HUB_TOKEN')}"}
+        # Local backends pass api_url=None and never touch the HTTP client
+        self.llm_client = llm_client or (LLMClient(self.api_url, headers=self.headers) if api_url else None)
         self.model_name = "meta-llama/Llama-2-7b-chat-hf"
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
+        # Loaded on first use: inference goes through the HTTP API, so the
+        # weights are only needed by fine_tune and local-inference backends
+        self._tokenizer = None
+        self._model = None
+        self._load_lock = threading.Lock()
+        self.html_reducer = html_reducer or HTMLReducer(token_counter=self.count_tokens)
+        self.extraction_cache = extraction_cache if extraction_cache is not None else ExtractionCache()
+
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            with self._load_lock:
+                if self._tokenizer is None:
+                    from transformers import AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        return self._tokenizer
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from transformers import AutoModelForCausalLM
+                    logging.info(f"Loading model weights for {self.model_name}")
+                    self._model = AutoModelForCausalLM.from_pretrained(self.model_name)
+        return self._model
 
     def fine_tune(
         self,
@@ -69,138 +228,300 @@ class LLaMAModel(LLMInterface):
         epochs=3,
         batch_size=4,
         learning_rate=2e-4,
-        num_synthetic_examples=1000
+        num_synthetic_examples=1000,
+        max_length=1024,
+        packing=True,
+        validation_fraction=0.05,
+        cache_dir="training_cache",
+        seed=0
     ):
         """Fine-tunes the LLaMA model on the specified dataset.
 
         Args:
-            dataset_name: Name of the dataset on the Hugging Face Hub.
+            dataset_name: Name of the dataset on the Hugging Face Hub, or a directory of Parquet shards.
             output_dir: Directory to save the fine-tuned model.
             epochs: Number of training epochs.
             batch_size: Batch size for training.
             learning_rate: Learning rate for the optimizer.
             num_synthetic_examples: Number of synthetic examples to generate if no dataset_name is provided.
+            max_length: Sequence length examples are packed into (or truncated to).
+            packing: Pack examples into full rows; otherwise batch them grouped by length.
+            validation_fraction: Share held out for evaluation when the dataset has no validation split.
+            cache_dir: Where tokenized data is cached between runs.
+            seed: Seed for synthetic data and the validation split.
         """
-        if dataset_name:
+        # Training dependencies are heavy and only needed here
+        from transformers import Trainer, TrainingArguments
+        from training_data import prepare_training_data, iter_parquet_examples, PaddingCollator
+
+        validation_examples = None
+        if dataset_name and os.path.isdir(dataset_name):
+            examples = iter_parquet_examples(dataset_name)
+        elif dataset_name:
+            from datasets import load_dataset
             dataset = load_dataset(dataset_name)
+            examples = dataset["train"]
+            if "validation" in dataset:
+                validation_examples = dataset["validation"]
         else:
-            generator = AmazonOrderDataGenerator()
-            synthetic_data = generator.generate_dataset(num_synthetic_examples)
-            dataset = Dataset.from_pandas(pd.DataFrame(synthetic_data))
+            generator = AmazonOrderDataGenerator(seed=seed)
+            examples = generator.iter_examples(num_synthetic_examples)
+
+        # Tokenized once per tokenizer/dataset; later runs load it from cache_dir
+        prepared = prepare_training_data(
+            self.tokenizer,
+            examples,
+            validation_examples=validation_examples,
+            cache_dir=cache_dir,
+            max_length=max_length,
+            packing=packing,
+            validation_fraction=validation_fraction,
+            batch_size=batch_size,
+            seed=seed
+        )
+        print(f"Training data: {json.dumps(prepared.report)}")
+
+        # Unpacked sequences vary in length; batching similar lengths keeps padding low
+        # (transformers 5 replaced the group_by_length flag with a sampling strategy)
+        length_grouping = {}
+        if not packing:
+            if "train_sampling_strategy" in TrainingArguments.__dataclass_fields__:
+                length_grouping = {"train_sampling_strategy": "group_by_length"}
+            else:
+                length_grouping = {"group_by_length": True}
 
         training_args = TrainingArguments(
             output_dir=output_dir,
             per_device_train_batch_size=batch_size,
+            per_device_eval_batch_size=batch_size,
             gradient_accumulation_steps=4,
             learning_rate=learning_rate,  
             num_train_epochs=epochs, 
             optim="adamw_torch",
-            evaluation_strategy="epoch", 
+            eval_strategy="epoch",
+            remove_unused_columns=False,
+            seed=seed,
+            **length_grouping
         )
 
-        # Create the SFTTrainer (PEFT technique for fine-tuning)
-        trainer = SFTTrainer(
+        pad_token_id = self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else self.tokenizer.eos_token_id
+        # Data is already tokenized, so a plain Trainer is enough
+        trainer = Trainer(
             model=self.model,
-            train_dataset=dataset["train"],
-            eval_dataset=dataset["validation"],
             args=training_args,
-            tokenizer=self.tokenizer,
+            train_dataset=prepared.train,
+            eval_dataset=prepared.validation,
+            data_collator=PaddingCollator(pad_token_id),
         )
 
         # Start training
-        trainer.train()
+        result = trainer.train()
+        tokens_per_second = prepared.report["train_tokens"] * epochs / result.metrics["train_runtime"]
+        logging.info(f"Fine-tuning processed {tokens_per_second:.0f} tokens/s")
+        print(f"Fine-tuning throughput: {tokens_per_second:.0f} tokens/s")
 
         # Save the fine-tuned model
         self.model.save_pretrained(output_dir)
         self.tokenizer.save_pretrained(output_dir)
 
-    def _call_llm(self, prompt, max_tokens=200):
-        data = {
-            "inputs": prompt,
-            "parameters": {"max_new_tokens": max_tokens}
-        }
-        response = requests.post(self.api_url, headers=self.headers, json=data)
-        response.raise_for_status()  # Raise an exception for bad responses
-        return response.json()[0]['generated_text']
+    def count_tokens(self, text):
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def _prepare_html(self, html_content, prompt_template, max_tokens=200, subtree_selectors=None, **prompt_fields):
+        """Reduces `html_content` and returns one prompt per token-budgeted chunk."""
+        overhead = self.count_tokens(prompt_template.format(html_content="", **prompt_fields))
+        budget = MAX_CONTEXT_TOKENS - max_tokens - overhead
+        chunks, _ = self.html_reducer.prepare(html_content, budget, subtree_selectors)
+        return [prompt_template.format(html_content=chunk, **prompt_fields) for chunk in chunks]
+
+    def _grammar_parameters(self, schema):
+        return {"grammar": {"type": "json", "value": schema}} if schema and self.json_grammar else {}
+
+    def _call_llm(self, prompt, max_tokens=200, schema=None):
+        with metrics.timer("llm_call_seconds", backend=self.backend, mode="single"):
+            output = self.llm_client.generate(prompt, max_tokens, **self._grammar_parameters(schema))
+        self._record_llm_call([prompt], [output])
+        return output
+
+    def _call_llm_batch(self, prompts, max_tokens=200, schema=None):
+        with metrics.timer("llm_call_seconds", backend=self.backend, mode="batch"):
+            outputs = self.llm_client.generate_batch(prompts, max_tokens, **self._grammar_parameters(schema))
+        self._record_llm_call(prompts, outputs)
+        return outputs
+
+    def _record_llm_call(self, prompts, outputs):
+        metrics.inc("llm_prompts_total", len(prompts), backend=self.backend)
+        for prompt, output in zip(prompts, outputs):
+            metrics.observe("llm_prompt_bytes", len(prompt.encode("utf-8")), SIZE_BUCKETS, backend=self.backend)
+            metrics.observe("llm_response_bytes", len(output.encode("utf-8")), SIZE_BUCKETS, backend=self.backend)
+
+    @property
+    def model_identity(self):
+        return self.api_url or self.model_name
+
+    def _call_llm_cached(self, prompts, prompt_template, max_tokens=200, validate=None, schema=None):
+        """Like `_call_llm_batch`, memoized on (model, template version, reduced prompt).
+
+        `max_tokens` may be a list with one budget per prompt; a batch is
+        generated with the largest of them. Outputs rejected by `validate`
+        are returned but not cached, so a bad generation is retried next
+        time instead of being replayed forever.
+        """
+        budgets = max_tokens if isinstance(max_tokens, list) else [max_tokens] * len(prompts)
+        if self.extraction_cache is None:
+            return self._call_llm_batch(prompts, max(budgets, default=0), schema)
+        version = template_version(prompt_template)
+        keys = [cache_key(self.model_identity, version, budget, prompt) for prompt, budget in zip(prompts, budgets)]
+        outputs = [self.extraction_cache.get(key) for key in keys]
+        missing = [index for index, output in enumerate(outputs) if output is None]
+        if missing:
+            generated = self._call_llm_batch([prompts[index] for index in missing], max(budgets[index] for index in missing), schema)
+            for index, output in zip(missing, generated):
+                outputs[index] = output
+                if validate is None or validate(output):
+                    self.extraction_cache.put(keys[index], output)
+        return outputs
 
     def extract_order_data(self, html_content):
-        prompt = f"""Extract the following information from this Amazon order confirmation HTML, in JSON format:
-
-        {
-            "order_id": "",
-            "order_date": "",
-            "order_total": "",
-            "shipping_address": "",
-            "delivery_status": "",
-            "items": [
-                {
-                    "name": "",
-                    "quantity": "",
-                    "price": ""
-                }
-            ]
-        }
-
-        Replace the empty string values ("") with the corresponding data from the HTML. If a piece of information is not present in the HTML, fill the corresponding value with "N/A".
-
-        HTML:
-        ```
-        {html_content}
-        ```
-        JSON:
+        return self.extract_order_data_batch([html_content])[0]
+
+    def extract_order_data_batch(self, html_contents):
+        """Extracts several orders with all their prompts submitted to the LLM at once."""
+        prompts, owners, budgets = [], [], []
+        for index, html_content in enumerate(html_contents):
+            # Orders with more items need a longer answer
+            max_tokens = order_token_budget(html_content)
+            for prompt in self._prepare_html(html_content, ORDER_DATA_PROMPT, max_tokens, subtree_selectors=ORDER_DETAILS_SELECTORS):
+                prompts.append(prompt)
+                owners.append(index)
+                budgets.append(max_tokens)
+
+        results = [[] for _ in html_contents]
+        output_tokens = [0] * len(html_contents)
+        outputs = self._call_llm_cached(
+            prompts, ORDER_DATA_PROMPT, budgets, validate=is_complete_order_output, schema=ORDER_JSON_SCHEMA
+        )
+        for index, json_string in zip(owners, outputs):
+            # Truncated answers are closed and kept rather than paid for twice
+            order_data, outcome = parse_order_output(json_string)
+            metrics.inc("llm_json_parse_total", prompt="order_data", outcome=outcome)
+            output_tokens[index] += self.count_tokens(json_string)
+            if outcome == "failed":
+                logging.warning("LLM did not return valid JSON for order data extraction")
+                continue
+            if outcome == "repaired":
+                logging.info("Completed truncated JSON for order data extraction")
+            results[index].append(order_data)
+        for tokens in output_tokens:
+            metrics.observe("llm_output_tokens_per_order", tokens, TOKEN_BUCKETS, backend=self.backend)
+        return [self._merge_order_data(order_results) for order_results in results]
+
+    @staticmethod
+    def _merge_order_data(results):
+        # An order split across chunks: first real value wins, items accumulate
+        merged = {}
+        for result in results:
+            for key, value in result.items():
+                if key == "items":
+                    merged.setdefault("items", []).extend(value or [])
+                elif merged.get(key) in (None, "", "N/A"):
+                    merged[key] = value
+        return merged
+
+    def extract_order_summaries(self, html_content):
+        """Reads every order card on a history page; returns (order_data, details_url) pairs.
+
+        order_data follows the `extract_order_data` schema, with no items and
+        no shipping address since history pages do not show them.
         """
-        
-        json_string = self._call_llm(prompt)
-        try:
-            return json.loads(json_string)
-        except json.JSONDecodeError:
-            # Handle cases where the LLM doesn't output valid JSON
-            logging.warning("LLM did not return valid JSON for order data extraction")
-            return {}
+        prompts = self._prepare_html(
+            html_content, ORDER_SUMMARIES_PROMPT, ORDER_SUMMARIES_MAX_TOKENS, subtree_selectors=ORDER_HISTORY_SELECTORS
+        )
+        summaries, seen = [], set()
+        for json_string in self._call_llm_cached(prompts, ORDER_SUMMARIES_PROMPT, ORDER_SUMMARIES_MAX_TOKENS, validate=_is_json_list):
+            try:
+                entries = json.loads(json_string)
+            except json.JSONDecodeError:
+                logging.warning("LLM did not return valid JSON for order summary extraction")
+                continue
+            for entry in entries if isinstance(entries, list) else []:
+                if not isinstance(entry, dict) or entry.get("order_id") in seen:
+                    continue
+                seen.add(entry.get("order_id"))
+                details_url = entry.get("details_url")
+                summaries.append(({
+                    "order_id": entry.get("order_id", "N/A"),
+                    "order_date": entry.get("order_date", "N/A"),
+                    "order_total": entry.get("order_total", "N/A"),
+                    "shipping_address": "N/A",
+                    "delivery_status": entry.get("delivery_status", "N/A"),
+                    "items": []
+                }, details_url if details_url not in (None, "", "N/A") else None))
+        return summaries
 
     def find_next_page_element(self, html_content, driver):
-        prompt = f"""Analyze this HTML content and return the CSS selector for the "Next Page" button or link that takes you to another page, if it exists. If there is no next page, return "NONE".
-
-        HTML:
-        ```
-        {html_content}
-        ```
-        CSS Selector:"""
-
-        selector = self._call_llm(prompt).strip()
-        return driver.find_element(By.CSS_SELECTOR, selector) if selector != "NONE" else None
+        ranked = DOMIndex(html_content).rank(NEXT_PAGE_DESCRIPTION)
+        # Nothing resembling a next link is the normal state of the last page
+        if not ranked or ranked[0][0] < MIN_SCORE:
+            return None
+        element = self._choose_element(NEXT_PAGE_DESCRIPTION, ranked)
+        return driver.find_element(By.CSS_SELECTOR, element.selector) if element else None
     
     def get_order_details_urls(self, html_content):
-        prompt = f"""Extract the URLs for each order details page from this Amazon order history page HTML.
-
-        HTML:
-        ```
-        {html_content}
-        ```
-        URLs (comma-separated):"""
-        response = self._call_llm(prompt).strip()
-        return [url.strip() for url in response.split(',')] if response else []
+        urls = []
+        prompts = self._prepare_html(html_content, ORDER_URLS_PROMPT, subtree_selectors=ORDER_HISTORY_SELECTORS)
+        for response in self._call_llm_cached(prompts, ORDER_URLS_PROMPT):
+            response = response.strip()
+            for url in response.split(',') if response else []:
+                if url.strip() and url.strip() not in urls:
+                    urls.append(url.strip())
+        return urls
 
     def find_element_by_description(self, element_description, driver):
-        prompt = f"""Analyze the current page HTML and find the element that best matches the following description:
-
-        ```
-        {element_description}
-        ```
-        
-        If multiple elements match the description, prioritize interactive elements like buttons, links, or input fields. Return the CSS selector for this element. If no element is found, return "NOT_FOUND".
-
-        HTML:
-        ```
-        {driver.get_page_source()}
-        ```
-
-        CSS Selector:"""
-
-        selector = self._call_llm(prompt).strip()
-        if selector == "NOT_FOUND":
-            raise NoSuchElementException(f"Element not found: {element_description}")
-        return driver.find_element(By.CSS_SELECTOR, selector)
+        page_source = driver.get_page_source()
+        fingerprint = page_fingerprint(page_source)
+
+        # Try the selector that worked last time on a page with the same structure
+        cached_selector = self.selector_cache.get(element_description, fingerprint)
+        if cached_selector:
+            try:
+                return driver.find_element(By.CSS_SELECTOR, cached_selector)
+            except NoSuchElementException:
+                logging.info(f"Cached selector '{cached_selector}' is stale for: {element_description}")
+                self.selector_cache.invalidate(element_description, fingerprint)
+
+        ranked = DOMIndex(page_source).rank(element_description)
+        match = self._choose_element(element_description, ranked) if ranked and ranked[0][0] >= MIN_SCORE else None
+        if match is not None:
+            element = driver.find_element(By.CSS_SELECTOR, match.selector)
+            self.selector_cache.put(element_description, fingerprint, match.selector)
+            return element
+
+        # No indexed element resembles the description, or the LLM rejected every
+        # candidate: let the LLM read the page itself
+        metrics.inc("element_lookups_total", path="llm_page")
+        for prompt in self._prepare_html(page_source, ELEMENT_PROMPT, element_description=element_description):
+            selector = self._call_llm(prompt).strip()
+            if selector != "NOT_FOUND":
+                element = driver.find_element(By.CSS_SELECTOR, selector)
+                self.selector_cache.put(element_description, fingerprint, selector)
+                return element
+        raise NoSuchElementException(f"Element not found: {element_description}")
+
+    def _choose_element(self, element_description, ranked):
+        """Picks from DOMIndex.rank output, asking the LLM only when the ranking is ambiguous."""
+        if DOMIndex.is_confident(ranked):
+            metrics.inc("element_lookups_total", path="local")
+            return ranked[0][1]
+        metrics.inc("element_lookups_total", path="llm_candidates")
+        candidates = [element for _, element in ranked]
+        prompt = ELEMENT_CANDIDATES_PROMPT.format(
+            element_description=element_description, candidates=DOMIndex.describe(candidates)
+        )
+        answer = self._call_llm_cached([prompt], ELEMENT_CANDIDATES_PROMPT, max_tokens=8)[0].strip().strip(".[]")
+        if answer.isdigit() and int(answer) < len(candidates):
+            return candidates[int(answer)]
+        return None
 
     def find_element_by_llm(self, html_content, driver):
         prompt = f"""Analyze the current page HTML and find the element that matches the following description:
@@ -216,12 +537,7 @@ class LLaMAModel(LLMInterface):
         return driver.find_element(By.CSS_SELECTOR, css_selector)
 
     def has_more_orders(self, html_content):
-        prompt = f"""Does this Amazon order history page contain a "Next Page" button? 
-
-        HTML:
-        ```
-        {html_content}
-        ```
-        Answer (Yes/No):"""
-        response = self._call_llm(prompt).strip()
-        return response.lower() == "yes"
+        for prompt in self._prepare_html(html_content, HAS_MORE_ORDERS_PROMPT, subtree_selectors=ORDER_HISTORY_SELECTORS):
+            if self._call_llm(prompt).strip().lower() == "yes":
+                return True
+        return False
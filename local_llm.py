@@ -0,0 +1,198 @@
+import copy
+import json
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from llm_interface import (
+    LLaMAModel,
+    ORDER_DATA_PROMPT,
+    ORDER_URLS_PROMPT,
+    ORDER_SUMMARIES_PROMPT,
+    HAS_MORE_ORDERS_PROMPT,
+    prompt_prefix
+)
+from metrics import metrics
+from order_schema import schema_prefix_allowed_tokens_fn, schema_tokenizer_data
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+# Instruction text shared by every prompt built from these templates; its
+# key/value cache is computed once and reused for every later prompt
+SHARED_PREFIXES = [prompt_prefix(template) for template in (ORDER_DATA_PROMPT, ORDER_URLS_PROMPT, ORDER_SUMMARIES_PROMPT, HAS_MORE_ORDERS_PROMPT)]
+
+
+class LocalLLaMAModel(LLaMAModel):
+    """Runs a saved model directory (e.g. the output of `fine_tune`) on CPU.
+
+    Concurrent `_call_llm` calls are queued and served by a single worker
+    that groups them into one batched `generate`. Prompts that start with one
+    of the template instruction prefixes reuse its precomputed KV cache, so
+    only the page-specific suffix is run through the model.
+    """
+
+    backend = "local"
+
+    def __init__(
+        self,
+        model_dir="fine_tuned_llama",
+        quantize=None,
+        max_batch_size=8,
+        batch_wait=0.02,
+        selector_cache=None,
+        html_reducer=None,
+        extraction_cache=None
+    ):
+        super().__init__(
+            api_url=None,
+            selector_cache=selector_cache,
+            html_reducer=html_reducer,
+            extraction_cache=extraction_cache
+        )
+        self.model_name = model_dir
+        self.quantize = quantize  # None or "int8"
+        self.max_batch_size = max_batch_size
+        self.batch_wait = batch_wait
+        self._prefix_cache = {}
+        # Built on the first schema-constrained generation; False when lm-format-enforcer is missing
+        self._schema_tokenizer_data = None
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._serve, name="local-llm", daemon=True)
+        self._worker.start()
+
+    @property
+    def tokenizer(self):
+        tokenizer = super().tokenizer
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        tokenizer.padding_side = "left"  # Generation continues from the right edge of every row
+        return tokenizer
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    import torch
+                    from transformers import AutoModelForCausalLM
+                    logging.info(f"Loading local model from {self.model_name} (quantize={self.quantize})")
+                    model = AutoModelForCausalLM.from_pretrained(self.model_name)
+                    if self.quantize == "int8":
+                        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                    elif self.quantize is not None:
+                        raise ValueError(f"Unsupported quantization: {self.quantize}")
+                    self._model = model.eval()
+        return self._model
+
+    def _call_llm(self, prompt, max_tokens=200, schema=None):
+        with metrics.timer("llm_call_seconds", backend=self.backend, mode="single"):
+            output = self._submit(prompt, max_tokens, schema).result()
+        self._record_llm_call([prompt], [output])
+        return output
+
+    def _call_llm_batch(self, prompts, max_tokens=200, schema=None):
+        with metrics.timer("llm_call_seconds", backend=self.backend, mode="batch"):
+            futures = [self._submit(prompt, max_tokens, schema) for prompt in prompts]
+            outputs = [future.result() for future in futures]
+        self._record_llm_call(prompts, outputs)
+        return outputs
+
+    def _submit(self, prompt, max_tokens, schema=None):
+        future = Future()
+        self._requests.put((prompt, max_tokens, schema, future))
+        return future
+
+    def _serve(self):
+        while True:
+            batch = [self._requests.get()]
+            # Give concurrent callers a moment to join the same forward pass
+            try:
+                while len(batch) < self.max_batch_size:
+                    batch.append(self._requests.get(timeout=self.batch_wait))
+            except queue.Empty:
+                pass
+
+            # Rows sharing an instruction prefix can share its cache; rows in
+            # one generate() call also share the output constraint
+            groups = {}
+            for request in batch:
+                groups.setdefault((self._shared_prefix(request[0]), self._schema_key(request[2])), []).append(request)
+            for (prefix, _), requests in groups.items():
+                try:
+                    metrics.observe("llm_batch_size", len(requests), BATCH_SIZE_BUCKETS, backend=self.backend)
+                    with metrics.timer("llm_generate_seconds", backend=self.backend):
+                        outputs = self._generate([r[0] for r in requests], max(r[1] for r in requests), prefix, requests[0][2])
+                    for (_, _, _, future), output in zip(requests, outputs):
+                        future.set_result(output)
+                except Exception as e:
+                    for _, _, _, future in requests:
+                        future.set_exception(e)
+
+    @staticmethod
+    def _schema_key(schema):
+        # Schemas arriving through the batch manager are fresh copies; group by value, not identity
+        return None if schema is None else json.dumps(schema, sort_keys=True)
+
+    @staticmethod
+    def _shared_prefix(prompt):
+        return next((prefix for prefix in SHARED_PREFIXES if prompt.startswith(prefix)), None)
+
+    def _prefix_state(self, prefix):
+        import torch
+        if prefix not in self._prefix_cache:
+            prefix_ids = self.tokenizer(prefix).input_ids
+            with torch.no_grad():
+                output = self.model(input_ids=torch.tensor([prefix_ids]), use_cache=True)
+            self._prefix_cache[prefix] = (prefix_ids, output.past_key_values)
+        return self._prefix_cache[prefix]
+
+    @staticmethod
+    def _expand_cache(cache, batch_size):
+        cache = copy.deepcopy(cache)  # generate() extends the cache in place
+        if hasattr(cache, "batch_repeat_interleave"):
+            cache.batch_repeat_interleave(batch_size)
+            return cache
+        return tuple((key.repeat(batch_size, 1, 1, 1), value.repeat(batch_size, 1, 1, 1)) for key, value in cache)
+
+    def _schema_constraint(self, schema):
+        """The prefix_allowed_tokens_fn enforcing `schema`, or None when unconstrained."""
+        if schema is None:
+            return None
+        if self._schema_tokenizer_data is None:
+            self._schema_tokenizer_data = schema_tokenizer_data(self.tokenizer) or False
+        if not self._schema_tokenizer_data:
+            return None
+        return schema_prefix_allowed_tokens_fn(self._schema_tokenizer_data, schema)
+
+    def _generate(self, prompts, max_tokens, prefix=None, schema=None):
+        import torch
+        tokenizer, model = self.tokenizer, self.model
+
+        if prefix is None:
+            encoded = tokenizer(prompts, return_tensors="pt", padding=True)
+            input_ids, attention_mask, past_key_values = encoded.input_ids, encoded.attention_mask, None
+        else:
+            prefix_ids, prefix_cache = self._prefix_state(prefix)
+            suffixes = [tokenizer(prompt[len(prefix):], add_special_tokens=False).input_ids for prompt in prompts]
+            longest = max(len(suffix) for suffix in suffixes)
+            # Padding sits between the cached prefix and each suffix so all rows
+            # end together; it is masked out and positions follow the mask
+            rows, masks = [], []
+            for suffix in suffixes:
+                padding = longest - len(suffix)
+                rows.append(prefix_ids + [tokenizer.pad_token_id] * padding + suffix)
+                masks.append([1] * len(prefix_ids) + [0] * padding + [1] * len(suffix))
+            input_ids, attention_mask = torch.tensor(rows), torch.tensor(masks)
+            past_key_values = self._expand_cache(prefix_cache, len(prompts))
+
+        with torch.no_grad():
+            output = model.generate(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                past_key_values=past_key_values,
+                max_new_tokens=max_tokens,
+                do_sample=False,
+                prefix_allowed_tokens_fn=self._schema_constraint(schema),
+                pad_token_id=tokenizer.pad_token_id,
+            )
+        return tokenizer.batch_decode(output[:, input_ids.shape[1]:], skip_special_tokens=True)
@@ -1,13 +1,37 @@
+import os
+from contextlib import nullcontext
 from agent import Agent
 from llm_interface import LLaMAModel
+from metrics import metrics, profiled
+
+
+def create_llm_model(backend="http"):
+    # "local" runs the fine-tuned model on this machine instead of the Inference API
+    if backend == "local":
+        from local_llm import LocalLLaMAModel
+        return LocalLLaMAModel(
+            model_dir=os.environ.get("LOCAL_MODEL_DIR", "fine_tuned_llama"),
+            quantize=os.environ.get("LOCAL_MODEL_QUANTIZE")
+        )
+    # LLM_JSON_GRAMMAR=1 constrains answers with a TGI grammar (TGI endpoints only)
+    return LLaMAModel(json_grammar=os.environ.get("LLM_JSON_GRAMMAR") == "1")
+
 
 if __name__ == "__main__":
     username = "your_email@example.com"
     password = "your_amazon_password"
 
-    llama_model = LLaMAModel()
-    agent = Agent(
-        llm_model=llama_model
-    )
+    # AGENT_PROFILE=run.prof (cProfile) or run.html (pyinstrument) profiles this run
+    profile_path = os.environ.get("AGENT_PROFILE")
+    with profiled(profile_path) if profile_path else nullcontext():
+        try:
+            # Built once and shared by everything the agent creates
+            llama_model = create_llm_model(os.environ.get("LLM_BACKEND", "http"))
+            agent = Agent(
+                llm_model=llama_model
+            )
 
-    agent.fetch_order_details()
+            agent.fetch_order_details()
+        finally:
+            # metrics.prom for Prometheus text, anything else for JSON
+            metrics.write(os.environ.get("AGENT_METRICS", "agent_metrics.json"))
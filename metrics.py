@@ -0,0 +1,199 @@
+import json
+import time
+import logging
+import threading
+import functools
+from collections import deque
+from contextlib import contextmanager
+
+# Seconds; covers waits and page loads through slow LLM generations
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Bytes; prompts and responses from a short answer up to an unreduced page
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self):
+        total, result = 0, []
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+def _labels_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + list(extra or [])
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class Metrics:
+    """In-process counters, histograms and spans for one agent run.
+
+    Everything is keyed by metric name plus keyword labels. Exported as
+    Prometheus text (`to_prometheus`) or JSON (`snapshot`); `write` picks the
+    format from the file extension. Spans keep the most recent `max_spans`.
+    """
+
+    def __init__(self, max_spans=10000):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.spans = deque(maxlen=max_spans)
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            key = _labels_key(labels)
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            key = _labels_key(labels)
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of `timer`."""
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Records one timed unit of work (e.g. a single order) with free-form attributes."""
+        record = {"name": name, "start": time.time(), "thread": threading.current_thread().name, **attributes}
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception as e:
+            record["error"] = type(e).__name__
+            raise
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            with self._lock:
+                self.spans.append(record)
+            self.observe("span_seconds", record["seconds"], span=name)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.spans.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                    for name, series in self.counters.items()
+                },
+                "histograms": {
+                    name: [
+                        {
+                            "labels": dict(key),
+                            "count": histogram.count,
+                            "sum": histogram.sum,
+                            "buckets": dict(zip(map(str, histogram.buckets), histogram.cumulative())),
+                        }
+                        for key, histogram in series.items()
+                    ]
+                    for name, series in self.histograms.items()
+                },
+                "spans": list(self.spans),
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    for bound, count in zip(histogram.buckets, histogram.cumulative()):
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes Prometheus text for .prom/.txt paths and JSON otherwise."""
+        with open(path, 'w', encoding='utf-8') as file:
+            if path.endswith((".prom", ".txt")):
+                file.write(self.to_prometheus())
+            else:
+                json.dump(self.snapshot(), file, indent=4)
+        logging.info(f"Metrics written to {path}")
+
+
+# Process-wide registry used by the instrumented modules
+metrics = Metrics()
+
+
+@contextmanager
+def profiled(output, profiler=None):
+    """Profiles the enclosed block with cProfile (.prof output) or pyinstrument (.html/.txt output)."""
+    profiler = profiler or ("cprofile" if output.endswith(".prof") else "pyinstrument")
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ImportError("pyinstrument profiling requires the 'pyinstrument' package") from None
+        session = Profiler()
+        session.start()
+        try:
+            yield session
+        finally:
+            session.stop()
+            with open(output, 'w', encoding='utf-8') as file:
+                file.write(session.output_html() if output.endswith(".html") else session.output_text())
+            logging.info(f"Profile written to {output}")
+        return
+
+    import cProfile
+    session = cProfile.Profile()
+    session.enable()
+    try:
+        yield session
+    finally:
+        session.disable()
+        session.dump_stats(output)
+        logging.info(f"Profile written to {output}")
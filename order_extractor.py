@@ -0,0 +1,425 @@
+import os
+import re
+import json
+import logging
+import threading
+from collections import Counter
+from bs4 import BeautifulSoup, Tag
+from llm_interface import ORDER_DETAILS_SELECTORS
+from selector_cache import page_fingerprint
+from order_schema import MISSING
+
+# Fields that must be present for a fast-path result to be trusted
+REQUIRED_FIELDS = ["order_id", "order_date", "order_total"]
+# What an order-history card shows; anything beyond these needs the detail page
+SUMMARY_FIELDS = REQUIRED_FIELDS + ["delivery_status"]
+
+_QTY_RE = re.compile(r"Qty:\s*(\d+)")
+_ITEM_LINE_RE = re.compile(r"^(?P<name>.+?)\s*\(Qty:\s*(?P<quantity>\d+),\s*Price:\s*(?P<price>[^)]+)\)$")
+
+
+def _text(element):
+    return element.get_text(" ", strip=True) if element is not None else ""
+
+
+def _quantity(value):
+    match = _QTY_RE.search(value)
+    if match:
+        return int(match.group(1))
+    return int(value) if value.strip().isdigit() else value.strip()
+
+
+def _fill_missing(order_data):
+    """Marks fields a rule found empty as "N/A", as the LLM path does."""
+    for field, value in order_data.items():
+        if field != "items" and value in (None, ""):
+            order_data[field] = MISSING
+    for item in order_data.get("items") or []:
+        for field, value in item.items():
+            if value in (None, ""):
+                item[field] = MISSING
+    return order_data
+
+
+def is_complete(order_data, fields=REQUIRED_FIELDS):
+    return bool(order_data) and all(order_data.get(field) not in (None, "", "N/A") for field in fields)
+
+
+class Rule:
+    """A known order-page layout: `root_selector` identifies it, `parse` reads it."""
+
+    def __init__(self, name, root_selector, parse=None):
+        self.name = name
+        self.root_selector = root_selector
+        if parse is not None:
+            self.parse = parse
+
+    def extract(self, soup):
+        root = soup.select_one(self.root_selector)
+        if root is None:
+            return None
+        return self.parse(root)
+
+    def parse(self, root):
+        raise NotImplementedError
+
+
+def _parse_span_layout(root):
+    # <span class="a-color-secondary">Order ID:</span> D01-...
+    labels = {}
+    for span in root.select("span.a-color-secondary"):
+        value = span.next_sibling
+        labels[_text(span).rstrip(":").lower()] = value.strip() if isinstance(value, str) else _text(value)
+    items = []
+    for row in root.select("#ordersInPackage-container .a-fixed-left-grid-inner"):
+        items.append({
+            "name": _text(row.select_one("a.a-link-normal")),
+            "quantity": _quantity(_text(row.select_one(".item-view-qty"))),
+            "price": _text(row.select_one(".a-offscreen")),
+        })
+    return {
+        "order_id": labels.get("order id", MISSING),
+        "order_date": labels.get("order placed", MISSING),
+        "order_total": labels.get("total", MISSING),
+        "shipping_address": _text(root.select_one("#shippingAddressWidget .displayAddressLI")),
+        "delivery_status": _text(root.select_one("#deliveryStatusBarWidget-container .a-row")),
+        "items": items,
+    }
+
+
+def _parse_section_layout(root):
+    # <h2>Order D01-...</h2><p>Placed on ...</p><p>Total: ...</p><h3>Shipping Address:</h3><p>...</p>
+    paragraphs = [_text(p) for p in root.find_all("p", recursive=False)]
+    headed = {}
+    for heading in root.find_all("h3", recursive=False):
+        following = heading.find_next_sibling()
+        if following is not None and following.name == "p":
+            headed[_text(heading).rstrip(":").lower()] = _text(following)
+    items = []
+    for li in root.select("ul > li"):
+        match = _ITEM_LINE_RE.match(_text(li))
+        if match:
+            items.append({
+                "name": match.group("name"),
+                "quantity": int(match.group("quantity")),
+                "price": match.group("price").strip(),
+            })
+    order_id = _text(root.find("h2"))
+    return {
+        "order_id": order_id[len("Order "):] if order_id.startswith("Order ") else MISSING,
+        "order_date": next((p[len("Placed on "):] for p in paragraphs if p.startswith("Placed on ")), MISSING),
+        "order_total": next((p[len("Total: "):] for p in paragraphs if p.startswith("Total: ")), MISSING),
+        "shipping_address": headed.get("shipping address", MISSING),
+        "delivery_status": headed.get("delivery status", MISSING),
+        "items": items,
+    }
+
+
+def _parse_table_layout(root):
+    # <tr><th>Order ID:</th><td>...</td></tr> followed by <tr><td>name</td><td>Qty: n, Price: $x</td></tr>
+    labels, items = {}, []
+    for row in root.find_all("tr"):
+        header, cells = row.find("th"), row.find_all("td")
+        if header is not None and len(cells) == 1:
+            labels[_text(header).rstrip(":").lower()] = _text(cells[0])
+        elif header is None and len(cells) == 2:
+            match = _ITEM_LINE_RE.match(f"{_text(cells[0])} ({_text(cells[1])})")
+            if match:
+                items.append({
+                    "name": match.group("name"),
+                    "quantity": int(match.group("quantity")),
+                    "price": match.group("price").strip(),
+                })
+    return {
+        "order_id": labels.get("order id", MISSING),
+        "order_date": labels.get("order placed", MISSING),
+        "order_total": labels.get("total", MISSING),
+        "shipping_address": labels.get("shipping address", MISSING),
+        "delivery_status": labels.get("delivery status", MISSING),
+        "items": items,
+    }
+
+
+BUILTIN_RULES = [
+    Rule("order_details_spans", "#orderDetails", _parse_span_layout),
+    Rule("order_details_section", ".order-details-section", _parse_section_layout),
+    Rule("order_details_table", "#orderDetailsTable", _parse_table_layout),
+]
+
+
+def _css_path(element, root):
+    """Builds a selector for `element` relative to `root` from tag names and positions."""
+    parts = []
+    while element is not None and element is not root:
+        if element.get("id"):
+            parts.append(f"#{element['id']}")
+            break
+        position = 1 + sum(1 for sibling in element.find_previous_siblings(element.name))
+        parts.append(f"{element.name}:nth-of-type({position})")
+        element = element.parent
+    return " > ".join(reversed(parts))
+
+
+class SelectorRule(Rule):
+    """A layout learned from a confirmed LLM extraction, stored as plain selectors.
+
+    `fields` maps a scalar field to {"selector", "prefix"}; `items` holds a row
+    selector plus the same kind of field specs relative to each row. The rule
+    only applies to pages whose root has the structural fingerprint it was
+    learned from, so positional selectors never run against foreign markup.
+    """
+
+    def __init__(self, name, root_selector, fields, items=None, fingerprint=None):
+        super().__init__(name, root_selector)
+        self.fields = fields
+        self.items = items
+        self.fingerprint = fingerprint
+
+    def extract(self, soup):
+        root = soup.select_one(self.root_selector)
+        if root is None or (self.fingerprint and page_fingerprint(str(root)) != self.fingerprint):
+            return None
+        return self.parse(root)
+
+    @staticmethod
+    def _read(node, spec):
+        value = _text(node.select_one(spec["selector"]))
+        prefix = spec.get("prefix", "")
+        return value[len(prefix):] if prefix and value.startswith(prefix) else value
+
+    def parse(self, root):
+        order_data = {field: self._read(root, spec) for field, spec in self.fields.items()}
+        order_data["items"] = []
+        if self.items:
+            for row in root.select(self.items["row_selector"]):
+                item = {field: self._read(row, spec) for field, spec in self.items["fields"].items()}
+                if "quantity" in item:
+                    item["quantity"] = _quantity(item["quantity"])
+                order_data["items"].append(item)
+        return order_data
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "root_selector": self.root_selector,
+            "fields": self.fields,
+            "items": self.items,
+            "fingerprint": self.fingerprint,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["name"], data["root_selector"], data["fields"], data.get("items"), data.get("fingerprint"))
+
+    @classmethod
+    def learn(cls, name, html_content, order_data, root_selectors):
+        """Derives a rule from `order_data` that was extracted from `html_content`.
+
+        Returns None unless every required field can be located in the markup
+        and re-applying the rule reproduces the confirmed values.
+        """
+        soup = BeautifulSoup(html_content, "html.parser")
+        root_selector = next((s for s in root_selectors + [":root"] if soup.select_one(s) is not None), None)
+        if root_selector is None:
+            return None
+        root = soup.select_one(root_selector)
+
+        fields = {}
+        for field, value in order_data.items():
+            if field == "items" or value in (None, "", "N/A"):
+                continue
+            spec = cls._locate(root, str(value))
+            if spec is None:
+                if field in REQUIRED_FIELDS:
+                    return None
+                continue
+            fields[field] = spec
+
+        items = cls._learn_items(root, order_data.get("items") or [])
+        rule = cls(name, root_selector, fields, items, page_fingerprint(str(root)))
+        learned = rule.extract(soup)
+        if learned is None:
+            return None
+        expected = {field: str(order_data[field]) for field in fields}
+        if {field: str(learned[field]) for field in fields} != expected or not is_complete(learned):
+            return None
+        if len(learned["items"]) != len(order_data.get("items") or []):
+            return None
+        return rule
+
+    @staticmethod
+    def _locate(node, value):
+        # The innermost element whose text is the value, optionally after a label
+        for element in node.find_all(True):
+            if any(isinstance(child, Tag) for child in element.children):
+                continue
+            text = _text(element)
+            if text == value or (text.endswith(value) and text[:-len(value)].rstrip().endswith(":")):
+                return {"selector": _css_path(element, node), "prefix": text[:-len(value)]}
+        return None
+
+    @classmethod
+    def _learn_items(cls, root, items):
+        if not items:
+            return None
+        name_spec = cls._locate(root, str(items[0].get("name", "")))
+        if name_spec is None:
+            return None
+        name_element = root.select_one(name_spec["selector"])
+        row = name_element.parent if name_element.parent is not root else name_element
+        # Drop the position on the row itself so the selector matches every item row
+        row_selector = re.sub(r":nth-of-type\(\d+\)$", "", _css_path(row, root))
+        if not row_selector:
+            return None
+        fields = {}
+        for field, value in items[0].items():
+            spec = cls._locate(row, str(value))
+            if spec is not None:
+                fields[field] = spec
+        return {"row_selector": row_selector, "fields": fields}
+
+
+# Order cards on the history page and the header labels they carry
+ORDER_CARD_SELECTOR = ".order-card, .js-order-card, .a-box-group.order"
+CARD_LABELS = {
+    "order placed": "order_date",
+    "total": "order_total",
+    "order #": "order_id",
+    "order number": "order_id",
+}
+CARD_STATUS_SELECTOR = ".delivery-box__primary-text, .yohtmlc-shipment-status-primaryText, .js-shipment-info-container .a-text-bold"
+
+
+def parse_order_cards(soup):
+    """Reads the order cards of a history page; returns (order_data, details_url, card_html) triples."""
+    cards = soup.select(ORDER_CARD_SELECTOR)
+    card_ids = {id(card) for card in cards}
+    summaries = []
+    for card in cards:
+        # Markup nests some card classes; only the outermost card counts
+        if any(id(parent) in card_ids for parent in card.parents):
+            continue
+        order_data = {
+            "order_id": "N/A",
+            "order_date": "N/A",
+            "order_total": "N/A",
+            "shipping_address": "N/A",
+            "delivery_status": "N/A",
+            "items": []
+        }
+        strings = list(card.stripped_strings)
+        for label, value in zip(strings, strings[1:]):
+            field = CARD_LABELS.get(label.lower().rstrip(":").strip())
+            if field and order_data[field] == "N/A":
+                order_data[field] = value
+        status = card.select_one(CARD_STATUS_SELECTOR)
+        if status is not None:
+            order_data["delivery_status"] = _text(status)
+        link = card.select_one('a[href*="order-details"]')
+        summaries.append((order_data, link["href"] if link is not None else None, str(card)))
+    return summaries
+
+
+class OrderExtractor:
+    """Extracts order data with known-layout rules, falling back to the LLM.
+
+    Results from the LLM fallback are turned into SelectorRules when possible,
+    so a layout only pays for an LLM call until it has been seen once.
+    """
+
+    def __init__(self, llm_model, rules=None, rules_path="extraction_rules.json", learn=True):
+        self.llm_model = llm_model
+        self.rules = list(BUILTIN_RULES if rules is None else rules)
+        self.rules_path = rules_path
+        self.learn = learn
+        self.stats = Counter()
+        self._lock = threading.Lock()
+        # Fetch workers extract concurrently; Counter updates are not atomic
+        self._stats_lock = threading.Lock()
+        self._load_learned_rules()
+
+    def _load_learned_rules(self):
+        if not self.rules_path or not os.path.exists(self.rules_path):
+            return
+        try:
+            with open(self.rules_path, 'r', encoding='utf-8') as file:
+                self.rules.extend(SelectorRule.from_dict(data) for data in json.load(file))
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"Ignoring unreadable extraction rules {self.rules_path}: {e}")
+
+    def _save_learned_rules(self):
+        if not self.rules_path:
+            return
+        learned = [rule.to_dict() for rule in self.rules if isinstance(rule, SelectorRule)]
+        with open(self.rules_path, 'w', encoding='utf-8') as file:
+            json.dump(learned, file, indent=4)
+
+    def register_rule(self, rule):
+        with self._lock:
+            self.rules.append(rule)
+            if isinstance(rule, SelectorRule):
+                self._save_learned_rules()
+
+    def extract_with_rules(self, html_content):
+        """Returns (order_data, rule name) from the first matching rule, or (None, None)."""
+        soup = BeautifulSoup(html_content or "", "html.parser")
+        for rule in list(self.rules):
+            try:
+                order_data = rule.extract(soup)
+            except (AttributeError, ValueError, TypeError) as e:
+                logging.debug(f"Rule {rule.name} failed: {e}")
+                continue
+            if order_data is not None and is_complete(order_data):
+                return _fill_missing(order_data), rule.name
+        return None, None
+
+    def extract(self, html_content):
+        """Returns (order_data, path) where path is "rule:<name>" or "llm"."""
+        return self.extract_batch([html_content])[0]
+
+    def extract_batch(self, html_contents):
+        """Like `extract` for many pages; all LLM fallbacks are submitted as one batch."""
+        results, fallback = [], []
+        for index, html_content in enumerate(html_contents):
+            order_data, rule_name = self.extract_with_rules(html_content)
+            if order_data is None:
+                fallback.append(index)
+            results.append((order_data, f"rule:{rule_name}"))
+
+        if fallback:
+            extracted = self.llm_model.extract_order_data_batch([html_contents[index] for index in fallback])
+            for index, order_data in zip(fallback, extracted):
+                results[index] = (order_data, "llm")
+                if self.learn and is_complete(order_data):
+                    self._learn_from(html_contents[index], order_data)
+
+        with self._stats_lock:
+            for _, path in results:
+                self.stats[path] += 1
+        return results
+
+    def extract_summaries(self, html_content):
+        """Extracts every order card on a history page in one pass.
+
+        Returns (summaries, path): (order_data, details_url, card_html)
+        triples and "rule:order_cards" or "llm". LLM summaries carry no card HTML.
+        """
+        summaries = parse_order_cards(BeautifulSoup(html_content or "", "html.parser"))
+        if summaries and any(is_complete(order_data) for order_data, _, _ in summaries):
+            path = "rule:order_cards"
+        else:
+            summaries = [
+                (order_data, details_url, None)
+                for order_data, details_url in self.llm_model.extract_order_summaries(html_content)
+            ]
+            path = "llm"
+        with self._stats_lock:
+            self.stats[f"summary:{path}"] += len(summaries)
+        return summaries, path
+
+    def _learn_from(self, html_content, order_data):
+        name = f"learned_{sum(isinstance(rule, SelectorRule) for rule in self.rules) + 1}"
+        rule = SelectorRule.learn(name, html_content, order_data, ORDER_DETAILS_SELECTORS)
+        if rule is not None:
+            logging.info(f"Registered fast-path rule {name} from LLM extraction")
+            self.register_rule(rule)
@@ -0,0 +1,90 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Orders in these states never change again, so their detail pages need no refetch
+FINAL_STATUSES = {"delivered", "canceled", "cancelled"}
+
+_ORDER_ID_RE = re.compile(r"orderI[dD]=([\w-]+)")
+
+
+def order_id_from_url(url):
+    match = _ORDER_ID_RE.search(url or "")
+    return match.group(1) if match else None
+
+
+def content_hash(order_json):
+    return hashlib.sha256(json.dumps(order_json, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class OrderIndex:
+    """SQLite index of known orders plus named crawl checkpoints."""
+
+    def __init__(self, path="order_index.sqlite3"):
+        self.path = path
+        self._lock = threading.Lock()
+        # Shared by the concurrent fetch workers; every access holds the lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS orders (
+                    order_id TEXT PRIMARY KEY,
+                    detail_url TEXT,
+                    content_hash TEXT,
+                    status TEXT,
+                    updated_at REAL
+                )"""
+            )
+            self._conn.execute("CREATE TABLE IF NOT EXISTS checkpoints (name TEXT PRIMARY KEY, state TEXT)")
+
+    def get(self, order_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT order_id, detail_url, content_hash, status, updated_at FROM orders WHERE order_id = ?",
+                (order_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(["order_id", "detail_url", "content_hash", "status", "updated_at"], row))
+
+    def is_final(self, order_id):
+        known = self.get(order_id)
+        return known is not None and (known["status"] or "").strip().lower() in FINAL_STATUSES
+
+    def upsert(self, order_id, detail_url, order_json):
+        """Records an extracted order; returns True if it is new or its content changed."""
+        digest = content_hash(order_json)
+        known = self.get(order_id)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO orders (order_id, detail_url, content_hash, status, updated_at)
+                   VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(order_id) DO UPDATE SET
+                       detail_url = excluded.detail_url,
+                       content_hash = excluded.content_hash,
+                       status = excluded.status,
+                       updated_at = excluded.updated_at""",
+                (order_id, detail_url, digest, order_json.get("delivery_status"), time.time())
+            )
+        return known is None or known["content_hash"] != digest
+
+    def save_checkpoint(self, name, state):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (name, state) VALUES (?, ?)", (name, json.dumps(state))
+            )
+
+    def load_checkpoint(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT state FROM checkpoints WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def clear_checkpoint(self, name):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM checkpoints WHERE name = ?", (name,))
+
+    def close(self):
+        self._conn.close()
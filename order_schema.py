@@ -0,0 +1,233 @@
+import re
+import json
+import logging
+
+# Short keys the model writes instead of the full field names; every key
+# costs tokens on every order
+ORDER_KEYS = {
+    "order_id": "i",
+    "order_date": "d",
+    "order_total": "t",
+    "shipping_address": "a",
+    "delivery_status": "s",
+    "items": "it",
+}
+ITEM_KEYS = {"name": "n", "quantity": "q", "price": "p"}
+MISSING = "N/A"
+
+ORDER_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        **{key: {"type": "string"} for field, key in ORDER_KEYS.items() if field != "items"},
+        "it": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                # Quantities are numbers, as in the training targets and the rule extractors
+                "properties": {"n": {"type": "string"}, "q": {"type": "integer"}, "p": {"type": "string"}},
+                "required": list(ITEM_KEYS.values()),
+            },
+        },
+    },
+    "required": list(ORDER_KEYS.values()),
+}
+
+# Generation budget: the fixed fields, plus room for each item
+BASE_ORDER_TOKENS = 96
+ITEM_TOKENS = 48
+MAX_ORDER_TOKENS = 1024
+
+_QTY_RE = re.compile(r"\b(?:qty|quantity)\b", re.I)
+_PRICE_RE = re.compile(r"[$€£]\s?\d[\d,]*(?:\.\d{2})?")
+
+
+def to_compact(order):
+    compact = {key: order.get(field, MISSING) for field, key in ORDER_KEYS.items() if field != "items"}
+    compact["it"] = [{key: item.get(field, MISSING) for field, key in ITEM_KEYS.items()} for item in order.get("items") or []]
+    return compact
+
+
+def compact_json(order):
+    """The exact answer text the extraction prompt asks for."""
+    if isinstance(order, str):
+        order = json.loads(order)
+    return json.dumps(to_compact(order), separators=(",", ":"), ensure_ascii=False)
+
+
+def _field_text(value):
+    return value if isinstance(value, str) else (MISSING if value is None else str(value))
+
+
+def _quantity_value(value):
+    """An int like the rule extractors return; text that isn't a number is kept as text."""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    text = _field_text(value).strip()
+    return int(text) if text.isdigit() else text
+
+
+def from_compact(data):
+    """Maps compact (or full) keys back to the order schema, filling absent fields with "N/A"."""
+    order = {}
+    for field, key in ORDER_KEYS.items():
+        if field != "items":
+            order[field] = _field_text(data.get(key, data.get(field)))
+    items = data.get("it", data.get("items")) or []
+    order["items"] = [
+        {
+            field: (_quantity_value if field == "quantity" else _field_text)(item.get(key, item.get(field)))
+            for field, key in ITEM_KEYS.items()
+        }
+        for item in items if isinstance(item, dict) and item
+    ]
+    return order
+
+
+def estimate_item_count(html_content):
+    """Items on an order page: one quantity label per item, or else every price but the total."""
+    quantities = len(_QTY_RE.findall(html_content))
+    if quantities:
+        return quantities
+    return max(1, len(_PRICE_RE.findall(html_content)) - 1)
+
+
+def order_token_budget(html_content):
+    return min(MAX_ORDER_TOKENS, BASE_ORDER_TOKENS + ITEM_TOKENS * estimate_item_count(html_content))
+
+
+class StreamingJSONParser:
+    """Incremental JSON scanner that can close truncated output.
+
+    `feed` accepts text as it is generated. `result` returns the parsed
+    value and whether it was complete: text cut off mid-way is trimmed back
+    to its last complete value and its open brackets are closed, so a
+    generation that ran out of tokens still yields every field it finished.
+    Anything before the first bracket (prose, code fences) and after the
+    root value is ignored.
+    """
+
+    def __init__(self):
+        self._chars = []
+        # Per open container: [bracket, what comes next: key/colon/value/comma]
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_is_key = False
+        self._literal = False
+        self._safe = 0
+        self._safe_closers = ""
+        self.done = False
+
+    def feed(self, text):
+        for char in text:
+            if self.done:
+                break
+            if not self._chars and char not in "{[":
+                continue
+            self._chars.append(char)
+            self._step(char, len(self._chars))
+        return self
+
+    def _mark_safe(self, position):
+        self._safe = position
+        self._safe_closers = "".join("}" if bracket == "{" else "]" for bracket, _ in reversed(self._stack))
+
+    def _value_done(self, position):
+        if not self._stack:
+            self.done = True
+            return
+        self._stack[-1][1] = "comma"
+        self._mark_safe(position)
+
+    def _step(self, char, position):
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._string_is_key:
+                    self._stack[-1][1] = "colon"
+                else:
+                    self._value_done(position)
+            return
+        if self._literal and (char in ",}]" or char.isspace()):
+            self._literal = False
+            self._value_done(position - 1)
+        if char.isspace():
+            return
+        if char in "{[":
+            self._stack.append([char, "key" if char == "{" else "value"])
+            self._mark_safe(position)
+        elif char in "}]":
+            if self._stack:
+                self._stack.pop()
+            self._value_done(position)
+        elif char == ":":
+            self._stack[-1][1] = "value"
+        elif char == ",":
+            self._stack[-1][1] = "key" if self._stack[-1][0] == "{" else "value"
+        elif char == '"':
+            self._in_string = True
+            self._string_is_key = self._stack[-1][0] == "{" and self._stack[-1][1] == "key"
+        else:
+            self._literal = True
+
+    def result(self):
+        """Returns (value, complete); value is None when nothing usable was produced."""
+        text = "".join(self._chars)
+        if not text:
+            return None, False
+        if self.done:
+            try:
+                return json.loads(text), True
+            except json.JSONDecodeError:
+                return None, False
+        try:
+            return json.loads(text[:self._safe] + self._safe_closers), False
+        except json.JSONDecodeError:
+            return None, False
+
+
+def parse_json_output(text):
+    """Parses a model's JSON answer, repairing truncation; returns (value, "ok"|"repaired"|"failed")."""
+    value, complete = StreamingJSONParser().feed(text or "").result()
+    if value is None:
+        return None, "failed"
+    return value, "ok" if complete else "repaired"
+
+
+def parse_order_output(text):
+    """Returns (order in the full schema, outcome) for an extraction answer in compact or full keys."""
+    value, outcome = parse_json_output(text)
+    if not isinstance(value, dict) or not value:
+        return {}, "failed"
+    return from_compact(value), outcome
+
+
+def is_complete_order_output(text):
+    return parse_order_output(text)[1] == "ok"
+
+
+def schema_tokenizer_data(tokenizer):
+    """Per-tokenizer tables for `schema_prefix_allowed_tokens_fn`; expensive, so build once.
+
+    Returns None, with a warning, when lm-format-enforcer is not installed.
+    """
+    # Imported here: lm-format-enforcer pulls in transformers, which the HTTP backend never needs
+    try:
+        from lmformatenforcer.integrations.transformers import build_token_enforcer_tokenizer_data
+    except ImportError:  # Local generation then runs unconstrained
+        logging.warning("lm-format-enforcer is not installed; local JSON generation is not schema-constrained")
+        return None
+    return build_token_enforcer_tokenizer_data(tokenizer)
+
+
+def schema_prefix_allowed_tokens_fn(tokenizer_data, schema=ORDER_JSON_SCHEMA):
+    """A `generate(prefix_allowed_tokens_fn=...)` hook that only lets the model write JSON matching `schema`."""
+    from lmformatenforcer import JsonSchemaParser
+    from lmformatenforcer.integrations.transformers import build_transformers_prefix_allowed_tokens_fn
+    return build_transformers_prefix_allowed_tokens_fn(tokenizer_data, JsonSchemaParser(schema))
@@ -0,0 +1,113 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip is always available
+    zstandard = None
+
+
+class StreamingOrderSink:
+    """Persists each order the moment it is extracted.
+
+    Raw HTML is compressed and stored content-addressed under `html/`, so
+    byte-identical pages are written once. Structured data is appended to
+    `orders.jsonl`, one record per line, and fsynced every `fsync_every`
+    records so a crash loses at most that many orders.
+    """
+
+    def __init__(self, directory="order_store", compression="gzip", fsync_every=20):
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package")
+        if compression not in ("gzip", "zstd"):
+            raise ValueError(f"Unsupported compression: {compression}")
+        self.directory = directory
+        self.compression = compression
+        self.fsync_every = fsync_every
+        self.html_dir = os.path.join(directory, "html")
+        self.jsonl_path = os.path.join(directory, "orders.jsonl")
+        os.makedirs(self.html_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.jsonl_path, 'a', encoding='utf-8')
+        self._unsynced = 0
+        self.records_written = 0
+        self.blobs_written = 0
+
+    def _blob_path(self, digest, compression=None):
+        extension = "zst" if (compression or self.compression) == "zstd" else "gz"
+        return os.path.join(self.html_dir, digest[:2], f"{digest}.html.{extension}")
+
+    def _write_blob(self, raw_html):
+        data = raw_html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = zstandard.ZstdCompressor().compress(data) if self.compression == "zstd" else gzip.compress(data)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as file:
+                file.write(compressed)
+            os.replace(tmp_path, path)
+            self.blobs_written += 1
+        return digest
+
+    def write(self, order):
+        """Stores `order` and returns it with `raw_html` replaced by `html_sha256`."""
+        record = {key: value for key, value in order.items() if key != "raw_html"}
+        record["fetched_at"] = time.time()
+        with self._lock:
+            if order.get("raw_html") is not None:
+                record["html_sha256"] = self._write_blob(order["raw_html"])
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            self.records_written += 1
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                self._sync()
+        return record
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def read_html(self, digest):
+        for compression in ("gzip", "zstd"):
+            path = self._blob_path(digest, compression)
+            if os.path.exists(path):
+                with open(path, 'rb') as file:
+                    data = file.read()
+                if compression == "zstd":
+                    return zstandard.ZstdDecompressor().decompress(data).decode("utf-8")
+                return gzip.decompress(data).decode("utf-8")
+        raise FileNotFoundError(f"No stored HTML for {digest}")
+
+    def position(self):
+        """Byte offset of the end of orders.jsonl; pass it to `iter_orders` to read only later records."""
+        with self._lock:
+            self._file.flush()
+            return self._file.tell()
+
+    def iter_orders(self, with_html=False, offset=0):
+        """Yields stored records one at a time, optionally with their raw HTML restored."""
+        with self._lock:
+            self._file.flush()
+        with open(self.jsonl_path, 'r', encoding='utf-8') as file:
+            file.seek(offset)
+            for line in file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if with_html and record.get("html_sha256"):
+                    record["raw_html"] = self.read_html(record["html_sha256"])
+                yield record
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                self._sync()
+                self._file.close()
@@ -0,0 +1,374 @@
+"""Typed, columnar copy of the extracted orders for spend analysis.
+
+    python order_store.py import order_json order_store/orders.jsonl
+    python order_store.py report
+"""
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import logging
+import argparse
+import functools
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # The order store is optional; extraction works without it
+    pa = None
+
+CENTS = Decimal("0.01")
+# Rows buffered in memory before they become a Parquet part
+FLUSH_ROWS = 50000
+
+CURRENCY_SYMBOLS = {"$": "USD", "€": "EUR", "£": "GBP", "¥": "JPY", "₹": "INR", "₦": "NGN"}
+# First keyword found in the delivery status text decides the normalized status
+STATUS_KEYWORDS = [
+    ("cancel", "canceled"),
+    ("refund", "returned"),
+    ("return", "returned"),
+    ("not yet shipped", "pending"),
+    ("out for delivery", "in_transit"),
+    ("deliver", "delivered"),
+    ("arriving", "in_transit"),
+    ("shipped", "shipped"),
+    ("pending", "pending"),
+    ("preparing", "pending"),
+]
+DATE_FORMATS = ["%Y-%m-%d", "%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%d %b %Y", "%m/%d/%Y", "%d.%m.%Y"]
+
+_AMOUNT_RE = re.compile(r"-?\d[\d.,\s]*")
+_CURRENCY_CODE_RE = re.compile(r"\b([A-Z]{3})\b")
+_DATE_RE = re.compile(
+    r"\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}/\d{4}|\d{1,2}\.\d{1,2}\.\d{4}|"
+    r"[A-Z][a-z]+\.? \d{1,2},? \d{4}|\d{1,2} [A-Z][a-z]+\.? \d{4}"
+)
+_INT_RE = re.compile(r"\d+")
+
+
+def parse_amount(text):
+    """Returns (Decimal rounded to cents, ISO currency code) or (None, None) for "N/A"-like values."""
+    if isinstance(text, (int, float, Decimal)):
+        return Decimal(str(text)).quantize(CENTS), None
+    text = (text or "").strip()
+    match = _AMOUNT_RE.search(text)
+    if not match:
+        return None, None
+    number = match.group(0).strip().replace(" ", "")
+    # "1.234,56" and "12,99" use a decimal comma; "1,234.56" a decimal point
+    if "," in number and ("." not in number or number.rfind(",") > number.rfind(".")) and len(number) - number.rfind(",") == 3:
+        number = number.replace(".", "").replace(",", ".")
+    else:
+        number = number.replace(",", "")
+    try:
+        amount = Decimal(number).quantize(CENTS)
+    except InvalidOperation:
+        return None, None
+    # "-$3.00": the sign comes before the currency symbol
+    if text.startswith("-") and amount > 0:
+        amount = -amount
+    currency = next((code for symbol, code in CURRENCY_SYMBOLS.items() if symbol in text), None)
+    if currency is None:
+        code = _CURRENCY_CODE_RE.search(text)
+        currency = code.group(1) if code else None
+    return amount, currency
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(text):
+    """Finds a date in free text ("Ordered on May 1, 2024", "2024-5-1") and returns a datetime.date."""
+    for candidate in _DATE_RE.findall(text or ""):
+        if not candidate[0].isdigit():
+            candidate = candidate.replace(".", "").replace("Sept ", "Sep ")
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.strptime(candidate, date_format).date()
+            except ValueError:
+                continue
+    return None
+
+
+def parse_quantity(value):
+    if isinstance(value, int):
+        return value
+    match = _INT_RE.search(str(value or ""))
+    return int(match.group(0)) if match else None
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_status(text):
+    text = (text or "").strip().lower()
+    if not text or text == "n/a":
+        return "unknown"
+    return next((status for keyword, status in STATUS_KEYWORDS if keyword in text), "other")
+
+
+def _text(value):
+    return None if value in (None, "", "N/A") else str(value)
+
+
+def normalize_order(order_json, details_url=None, fetched_at=None):
+    """Turns one extracted order into (order row, item rows) with typed values."""
+    order_date = parse_date(order_json.get("order_date"))
+    order_month = order_date.strftime("%Y-%m") if order_date else None
+    total, currency = parse_amount(order_json.get("order_total"))
+    fetched_at = datetime.fromtimestamp(fetched_at if fetched_at is not None else time.time())
+    order_id = _text(order_json.get("order_id"))
+    # Identifies this copy of the order and its items; fetch times can coincide
+    version = uuid.uuid4().hex
+    items = []
+    for line, item in enumerate(order_json.get("items") or []):
+        price, item_currency = parse_amount(item.get("price"))
+        quantity = parse_quantity(item.get("quantity"))
+        items.append({
+            "order_id": order_id,
+            "line": line,
+            "name": _text(item.get("name")),
+            "quantity": quantity,
+            "unit_price": price,
+            "line_total": (price * (quantity or 1)).quantize(CENTS) if price is not None else None,
+            "currency": item_currency or currency,
+            "order_month": order_month,
+            "fetched_at": fetched_at,
+            "version": version,
+        })
+    order = {
+        "order_id": order_id,
+        "order_date": order_date,
+        "order_month": order_month,
+        "order_total": total,
+        "currency": currency,
+        "status": normalize_status(order_json.get("delivery_status")),
+        "delivery_status": _text(order_json.get("delivery_status")),
+        "shipping_address": _text(order_json.get("shipping_address")),
+        "item_count": len(items),
+        "details_url": details_url,
+        "fetched_at": fetched_at,
+        "version": version,
+    }
+    return order, items
+
+
+def _schemas():
+    amount = pa.decimal128(18, 2)
+    orders = pa.schema([
+        ("order_id", pa.string()),
+        ("order_date", pa.date32()),
+        ("order_month", pa.string()),
+        ("order_total", amount),
+        ("currency", pa.string()),
+        ("status", pa.string()),
+        ("delivery_status", pa.string()),
+        ("shipping_address", pa.string()),
+        ("item_count", pa.int32()),
+        ("details_url", pa.string()),
+        ("fetched_at", pa.timestamp("ms")),
+        ("version", pa.string()),
+    ])
+    items = pa.schema([
+        ("order_id", pa.string()),
+        ("line", pa.int32()),
+        ("name", pa.string()),
+        ("quantity", pa.int32()),
+        ("unit_price", amount),
+        ("line_total", amount),
+        ("currency", pa.string()),
+        ("order_month", pa.string()),
+        ("fetched_at", pa.timestamp("ms")),
+        ("version", pa.string()),
+    ])
+    return orders, items
+
+
+class OrderStore:
+    """Orders and their items as two Parquet tables, with a few spend queries.
+
+    `add` normalizes orders (Decimal amounts, ISO dates, integer
+    quantities) and appends them as Parquet parts under `orders/` and
+    `items/`. An order seen again, e.g. after its status changed, is stored
+    again; queries use the most recently fetched version. `compact`
+    rewrites the parts into one file per table.
+    """
+
+    def __init__(self, directory="order_warehouse", flush_rows=FLUSH_ROWS):
+        if pa is None:
+            raise ValueError("The order store requires the 'pyarrow' package")
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.orders_dir = os.path.join(directory, "orders")
+        self.items_dir = os.path.join(directory, "items")
+        os.makedirs(self.orders_dir, exist_ok=True)
+        os.makedirs(self.items_dir, exist_ok=True)
+        self.orders_schema, self.items_schema = _schemas()
+        self._orders, self._items = [], []
+        self._tables = None
+        self.orders_written = 0
+
+    def add(self, orders):
+        """Adds extracted orders: fetcher/sink records ({"json", "details_url", "fetched_at"}) or bare order dicts."""
+        for order in orders:
+            order_json = order.get("json", order) if isinstance(order.get("json"), dict) else order
+            row, items = normalize_order(order_json, order.get("details_url"), order.get("fetched_at"))
+            if row["order_id"] is None:
+                logging.warning(f"Not storing an order without order_id ({order.get('details_url')})")
+                continue
+            self._orders.append(row)
+            self._items.extend(items)
+            if len(self._orders) >= self.flush_rows:
+                self.flush()
+        return self
+
+    def flush(self):
+        if not self._orders:
+            return
+        # Parts sort in write order, which breaks ties between equal fetch times
+        part = f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet"
+        pq.write_table(pa.Table.from_pylist(self._orders, self.orders_schema), os.path.join(self.orders_dir, part))
+        pq.write_table(pa.Table.from_pylist(self._items, self.items_schema), os.path.join(self.items_dir, part))
+        self.orders_written += len(self._orders)
+        self._orders, self._items = [], []
+        self._tables = None
+
+    def close(self):
+        self.flush()
+
+    def import_json_directory(self, directory="order_json"):
+        """Imports the per-order files written by save_orders_as_json; returns how many were read."""
+        count = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, 'r', encoding='utf-8') as file:
+                order_json = json.load(file)
+            self.add([{"json": order_json, "fetched_at": os.path.getmtime(path)}])
+            count += 1
+        self.flush()
+        return count
+
+    def import_jsonl(self, path="order_store/orders.jsonl"):
+        """Imports the records of a StreamingOrderSink; returns how many were read."""
+        count = 0
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    self.add([json.loads(line)])
+                    count += 1
+        self.flush()
+        return count
+
+    def _read(self, directory, schema):
+        parts = [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(".parquet")]
+        if not parts:
+            return schema.empty_table()
+        return pa.concat_tables([pq.read_table(part, schema=schema) for part in parts])
+
+    def tables(self):
+        """Returns (orders, items) as pyarrow Tables holding only the latest version of each order."""
+        self.flush()
+        if self._tables is None:
+            orders = self._read(self.orders_dir, self.orders_schema)
+            items = self._read(self.items_dir, self.items_schema)
+            counts = self._aggregate(orders, ["order_id"], [("order_id", "count", "versions")])
+            repeated = counts.filter(pc.greater(counts["versions"], 1))["order_id"]
+            if len(repeated):
+                # Only orders stored more than once need sorting by fetch time
+                is_repeated = pc.is_in(orders["order_id"], value_set=repeated.combine_chunks())
+                versions = orders.filter(is_repeated).sort_by([("order_id", "ascending"), ("fetched_at", "ascending")])
+                ids = versions["order_id"]
+                is_last = pc.not_equal(ids.slice(0, len(ids) - 1), ids.slice(1)).combine_chunks()
+                latest = pa.concat_arrays([is_last, pa.array([True])])
+                stale = versions.filter(pc.invert(latest)).select(["version"])
+                orders = pa.concat_tables([orders.filter(pc.invert(is_repeated)), versions.filter(latest)])
+                # Items carry their order's version; drop those of the superseded ones
+                items = items.join(stale, keys="version", join_type="left anti")
+            self._tables = (orders, items)
+        return self._tables
+
+    def compact(self):
+        """Rewrites all parts as one deduplicated file per table."""
+        orders, items = self.tables()
+        stale = {
+            directory: [name for name in os.listdir(directory) if name.endswith(".parquet")]
+            for directory in (self.orders_dir, self.items_dir)
+        }
+        self._orders, self._items = orders.to_pylist(), items.select(self.items_schema.names).to_pylist()
+        self.flush()
+        for directory, names in stale.items():
+            for name in names:
+                os.remove(os.path.join(directory, name))
+        self._tables = None
+
+    @staticmethod
+    def _aggregate(table, keys, aggregations):
+        """group_by/aggregate with the output columns renamed per `aggregations` [(column, function, name)]."""
+        grouped = table.group_by(keys).aggregate([(column, function) for column, function, _ in aggregations])
+        names = {f"{column}_{function}": name for column, function, name in aggregations}
+        return grouped.rename_columns([names.get(column, column) for column in grouped.column_names])
+
+    def totals_by_month(self, start=None, end=None):
+        """[{"month": "2024-05", "currency", "orders", "total"}]; `start`/`end` are inclusive "YYYY-MM" bounds."""
+        orders, _ = self.tables()
+        if start:
+            orders = orders.filter(pc.greater_equal(orders["order_month"], start))
+        if end:
+            orders = orders.filter(pc.less_equal(orders["order_month"], end))
+        orders = orders.select(["order_month", "currency", "order_id", "order_total"])
+        orders = orders.rename_columns(["month", "currency", "order_id", "order_total"])
+        grouped = self._aggregate(orders, ["month", "currency"], [
+            ("order_id", "count", "orders"), ("order_total", "sum", "total")
+        ])
+        return grouped.sort_by([("month", "ascending"), ("currency", "ascending")]).to_pylist()
+
+    def totals_by_status(self):
+        """[{"status", "currency", "orders", "total"}], largest spend first."""
+        orders, _ = self.tables()
+        grouped = self._aggregate(orders, ["status", "currency"], [
+            ("order_id", "count", "orders"), ("order_total", "sum", "total")
+        ])
+        return grouped.sort_by([("total", "descending"), ("status", "ascending")]).to_pylist()
+
+    def top_items(self, limit=10, by="spend"):
+        """[{"name", "quantity", "spend", "orders"}] for the `limit` items with the highest `by` ("spend" or "quantity")."""
+        if by not in ("spend", "quantity"):
+            raise ValueError(f"Unsupported ranking: {by}")
+        _, items = self.tables()
+        grouped = self._aggregate(items, ["name"], [
+            ("quantity", "sum", "quantity"), ("line_total", "sum", "spend"), ("order_id", "count_distinct", "orders")
+        ])
+        grouped = grouped.filter(pc.is_valid(grouped["name"]))
+        return grouped.sort_by([(by, "descending"), ("name", "ascending")]).slice(0, limit).to_pylist()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--directory", default="order_warehouse")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser("import", help="Import order_json directories and/or orders.jsonl files")
+    importer.add_argument("sources", nargs="+")
+    commands.add_parser("compact", help="Rewrite the store as one file per table")
+    report = commands.add_parser("report", help="Print spend by month and status and the top items")
+    report.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    store = OrderStore(args.directory)
+    if args.command == "import":
+        for source in args.sources:
+            count = store.import_json_directory(source) if os.path.isdir(source) else store.import_jsonl(source)
+            print(f"Imported {count} order(s) from {source}")
+    elif args.command == "compact":
+        store.compact()
+    else:
+        start = time.perf_counter()
+        report = {
+            "by_month": store.totals_by_month(),
+            "by_status": store.totals_by_status(),
+            "top_items": store.top_items(args.top),
+        }
+        json.dump(report, sys.stdout, indent=4, default=str)
+        print(f"\nQueried {store.tables()[0].num_rows} orders in {time.perf_counter() - start:.3f}s")
@@ -0,0 +1,78 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+
+# Tag name plus optional id/name attributes; text, classes and attribute values
+# that change between page loads (tokens, timestamps) are deliberately ignored.
+_TAG_RE = re.compile(r"<([a-zA-Z][a-zA-Z0-9-]*)([^>]*)>")
+_ID_RE = re.compile(r"""\b(id|name)\s*=\s*["']([^"']*)["']""")
+
+
+def page_fingerprint(html_content):
+    """Returns a structural fingerprint of a page.
+
+    The fingerprint is built from the set of (tag, id, name) triples on the
+    page, so it stays stable when only text content changes and moves when
+    the markup the selectors depend on changes.
+    """
+    shape = set()
+    for tag, attrs in _TAG_RE.findall(html_content or ""):
+        ids = dict(_ID_RE.findall(attrs))
+        shape.add((tag.lower(), ids.get("id", ""), ids.get("name", "")))
+    digest = hashlib.sha256(json.dumps(sorted(shape)).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+class SelectorCache:
+    """Persistent map of (element description, page fingerprint) -> CSS selector."""
+
+    def __init__(self, path="selector_cache.json"):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Ignoring unreadable selector cache {self.path}: {e}")
+            return {}
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self._entries, file, indent=4)
+        os.replace(tmp_path, self.path)  # Atomic swap so a crash never leaves half a file
+
+    @staticmethod
+    def _key(description, fingerprint):
+        return f"{fingerprint}:{description}"
+
+    def get(self, description, fingerprint):
+        with self._lock:
+            selector = self._entries.get(self._key(description, fingerprint))
+            if selector is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return selector
+
+    def put(self, description, fingerprint, selector):
+        with self._lock:
+            self._entries[self._key(description, fingerprint)] = selector
+            self._save()
+
+    def invalidate(self, description, fingerprint):
+        with self._lock:
+            if self._entries.pop(self._key(description, fingerprint), None) is not None:
+                self._save()
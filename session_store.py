@@ -0,0 +1,76 @@
+import os
+import json
+import time
+import logging
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # Sessions are only persisted when encryption is available
+    Fernet = None
+
+# Environment variable holding a Fernet key (see `SessionStore.generate_key`)
+SESSION_KEY_ENV = "AGENT_SESSION_KEY"
+# Older sessions are not worth a restore attempt; Amazon will have expired them
+DEFAULT_MAX_AGE = 14 * 24 * 3600
+
+
+class SessionStore:
+    """Keeps an authenticated browser session encrypted at rest.
+
+    The state (cookies plus local and session storage) is encrypted with
+    Fernet. The key comes from the AGENT_SESSION_KEY environment variable
+    or, failing that, from `key_path`, which is created with owner-only
+    permissions on first use.
+    """
+
+    def __init__(self, path="amazon_session.enc", key=None, key_path="amazon_session.key", max_age=DEFAULT_MAX_AGE):
+        if Fernet is None:
+            raise ValueError("Session persistence requires the 'cryptography' package")
+        self.path = path
+        self.key_path = key_path
+        self.max_age = max_age
+        self._fernet = Fernet(key or os.environ.get(SESSION_KEY_ENV) or self._load_or_create_key())
+
+    @staticmethod
+    def generate_key():
+        return Fernet.generate_key().decode("ascii")
+
+    def _load_or_create_key(self):
+        if os.path.exists(self.key_path):
+            with open(self.key_path, 'rb') as file:
+                return file.read().strip()
+        key = Fernet.generate_key()
+        fd = os.open(self.key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, 'wb') as file:
+            file.write(key)
+        logging.info(f"Created session key {self.key_path}; set {SESSION_KEY_ENV} to keep the key elsewhere")
+        return key
+
+    def save(self, state):
+        state = dict(state, saved_at=time.time())
+        token = self._fernet.encrypt(json.dumps(state).encode("utf-8"))
+        tmp_path = f"{self.path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as file:
+            file.write(token)
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        """Returns the saved state, or None if there is none or it is unreadable or too old."""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, 'rb') as file:
+            token = file.read()
+        try:
+            state = json.loads(self._fernet.decrypt(token))
+        except (InvalidToken, ValueError):
+            logging.warning(f"Ignoring saved session {self.path}: it cannot be decrypted with the current key")
+            return None
+        if self.max_age is not None and time.time() - state.get("saved_at", 0) > self.max_age:
+            logging.info("Saved session is too old to restore")
+            return None
+        return state
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import numpy as np
+from collections import namedtuple
+from extraction_cache import cache_key
+from llm_interface import ORDER_DATA_PROMPT, template_version
+from order_schema import compact_json
+
+# Loss is only taken on the JSON answer, never on the prompt or padding
+IGNORE_INDEX = -100
+
+PreparedData = namedtuple("PreparedData", ["train", "validation", "report"])
+
+
+def tokenizer_fingerprint(tokenizer):
+    vocab = json.dumps(sorted(tokenizer.get_vocab().items()))
+    return cache_key(type(tokenizer).__name__, tokenizer.name_or_path, hashlib.sha256(vocab.encode("utf-8")).hexdigest())
+
+
+def dataset_fingerprint(examples):
+    digest = hashlib.sha256()
+    for example in examples:
+        digest.update(example["html"].encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(example["output"].encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def iter_parquet_examples(directory):
+    """Streams {"html", "output"} rows from the Parquet shards written by AmazonOrderDataGenerator."""
+    import pyarrow.parquet as pq
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".parquet"):
+            for batch in pq.ParquetFile(os.path.join(directory, name)).iter_batches(columns=["html", "output"]):
+                yield from batch.to_pylist()
+
+
+class TokenizedDataset:
+    """Variable-length token sequences stored as flat arrays plus offsets.
+
+    Implements the `__len__`/`__getitem__` protocol transformers.Trainer
+    expects, returning {"input_ids", "labels"} lists per sequence.
+    """
+
+    def __init__(self, input_ids, labels, offsets):
+        self.input_ids = input_ids
+        self.labels = labels
+        self.offsets = offsets
+
+    @classmethod
+    def from_sequences(cls, sequences):
+        lengths = [len(input_ids) for input_ids, _ in sequences]
+        offsets = np.zeros(len(sequences) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        input_ids = np.fromiter((t for ids, _ in sequences for t in ids), dtype=np.int32, count=int(offsets[-1]))
+        labels = np.fromiter((t for _, lbl in sequences for t in lbl), dtype=np.int32, count=int(offsets[-1]))
+        return cls(input_ids, labels, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return {"input_ids": self.input_ids[start:end].tolist(), "labels": self.labels[start:end].tolist()}
+
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    def save(self, path):
+        np.savez(path, input_ids=self.input_ids, labels=self.labels, offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["input_ids"], data["labels"], data["offsets"])
+
+
+class PaddingCollator:
+    """Pads each batch only up to its own longest sequence."""
+
+    def __init__(self, pad_token_id):
+        self.pad_token_id = pad_token_id
+
+    def __call__(self, features):
+        import torch
+        longest = max(len(feature["input_ids"]) for feature in features)
+        input_ids = torch.full((len(features), longest), self.pad_token_id, dtype=torch.long)
+        labels = torch.full((len(features), longest), IGNORE_INDEX, dtype=torch.long)
+        attention_mask = torch.zeros((len(features), longest), dtype=torch.long)
+        for row, feature in enumerate(features):
+            length = len(feature["input_ids"])
+            input_ids[row, :length] = torch.tensor(feature["input_ids"])
+            labels[row, :length] = torch.tensor(feature["labels"])
+            attention_mask[row, :length] = 1
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+def tokenize_examples(tokenizer, examples, max_length, batch_size=256):
+    """Returns (input_ids, labels) per example: prompt tokens masked, answer plus EOS trained on.
+
+    Answers are trained in the prompt's compact-key format.
+    """
+    sequences, truncated = [], 0
+    for start in range(0, len(examples), batch_size):
+        batch = examples[start:start + batch_size]
+        prompts = tokenizer([ORDER_DATA_PROMPT.format(html_content=example["html"]) for example in batch]).input_ids
+        answers = tokenizer([compact_json(example["output"]) for example in batch], add_special_tokens=False).input_ids
+        for prompt_ids, answer_ids in zip(prompts, answers):
+            answer_ids = answer_ids + [tokenizer.eos_token_id]
+            input_ids = prompt_ids + answer_ids
+            labels = [IGNORE_INDEX] * len(prompt_ids) + answer_ids
+            if len(input_ids) > max_length:
+                # Keep the answer: drop the tail of the prompt's HTML instead
+                truncated += 1
+                keep = max(0, max_length - len(answer_ids))
+                input_ids = (prompt_ids[:keep] + answer_ids)[:max_length]
+                labels = ([IGNORE_INDEX] * keep + answer_ids)[:max_length]
+            sequences.append((input_ids, labels))
+    if truncated:
+        logging.warning(f"Truncated {truncated} example(s) longer than {max_length} tokens")
+    return sequences
+
+
+def pack_sequences(sequences, max_length, pad_token_id):
+    """Concatenates sequences into rows of exactly `max_length` tokens; only the last row is padded."""
+    input_stream = [t for input_ids, _ in sequences for t in input_ids]
+    label_stream = [t for _, labels in sequences for t in labels]
+    packed = []
+    for start in range(0, len(input_stream), max_length):
+        input_ids = input_stream[start:start + max_length]
+        labels = label_stream[start:start + max_length]
+        padding = max_length - len(input_ids)
+        packed.append((input_ids + [pad_token_id] * padding, labels + [IGNORE_INDEX] * padding))
+    return packed, (max_length - len(input_stream) % max_length) % max_length
+
+
+def padding_ratio(lengths, batch_size, bucketed, seed=0):
+    """Share of padding tokens when batches are padded to their longest sequence.
+
+    With `bucketed`, batches are formed from length-sorted mega-batches the
+    way transformers' `group_by_length` sampler does; otherwise at random.
+    """
+    lengths = list(lengths)
+    if not lengths:
+        return 0.0
+    order = list(range(len(lengths)))
+    random.Random(seed).shuffle(order)
+    if bucketed:
+        megabatch = batch_size * 50
+        order = [
+            index
+            for start in range(0, len(order), megabatch)
+            for index in sorted(order[start:start + megabatch], key=lambda i: -lengths[i])
+        ]
+    padded = 0
+    for start in range(0, len(order), batch_size):
+        batch = [lengths[i] for i in order[start:start + batch_size]]
+        padded += max(batch) * len(batch)
+    return 1 - sum(lengths) / padded
+
+
+def prepare_training_data(
+    tokenizer,
+    examples,
+    validation_examples=None,
+    cache_dir="training_cache",
+    max_length=1024,
+    packing=True,
+    validation_fraction=0.05,
+    batch_size=4,
+    seed=0
+):
+    """Tokenizes order examples once and caches the result on disk.
+
+    The cache key covers the tokenizer, the examples, the prompt template and
+    these settings, so reruns skip tokenization entirely. Without
+    `validation_examples`, `validation_fraction` of the examples is held out.
+    With `packing`, sequences are concatenated into fixed `max_length` rows;
+    otherwise they are kept whole for length-grouped batching.
+    """
+    examples = list(examples)
+    validation_examples = list(validation_examples) if validation_examples is not None else None
+    key = cache_key(
+        tokenizer_fingerprint(tokenizer),
+        dataset_fingerprint(examples),
+        dataset_fingerprint(validation_examples) if validation_examples is not None else validation_fraction,
+        template_version(ORDER_DATA_PROMPT),
+        max_length,
+        packing,
+        seed
+    )
+    directory = os.path.join(cache_dir, key[:32])
+    report_path = os.path.join(directory, "report.json")
+    if os.path.exists(report_path):
+        with open(report_path, 'r', encoding='utf-8') as file:
+            report = json.load(file)
+        report["cached"] = True
+        logging.info(f"Loaded tokenized training data from {directory}")
+        return PreparedData(
+            TokenizedDataset.load(os.path.join(directory, "train.npz")),
+            TokenizedDataset.load(os.path.join(directory, "validation.npz")),
+            report
+        )
+
+    if validation_examples is None:
+        indices = list(range(len(examples)))
+        random.Random(seed).shuffle(indices)
+        held_out = max(1, int(len(examples) * validation_fraction)) if len(examples) > 1 else 0
+        validation_examples = [examples[i] for i in indices[:held_out]]
+        examples = [examples[i] for i in indices[held_out:]]
+
+    pad_token_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else tokenizer.eos_token_id
+    start = time.perf_counter()
+    train_sequences = tokenize_examples(tokenizer, examples, max_length)
+    validation_sequences = tokenize_examples(tokenizer, validation_examples, max_length)
+    tokenize_seconds = time.perf_counter() - start
+    lengths = [len(input_ids) for input_ids, _ in train_sequences]
+    tokens = sum(lengths) + sum(len(input_ids) for input_ids, _ in validation_sequences)
+
+    report = {
+        "train_examples": len(train_sequences),
+        "validation_examples": len(validation_sequences),
+        "train_tokens": sum(lengths),
+        "answer_tokens": sum(sum(1 for t in labels if t != IGNORE_INDEX) for _, labels in train_sequences),
+        "tokenize_seconds": tokenize_seconds,
+        "tokenize_tokens_per_second": tokens / tokenize_seconds if tokenize_seconds else 0.0,
+        "max_length": max_length,
+        "packing": packing,
+        "unbucketed_padding_ratio": padding_ratio(lengths, batch_size, bucketed=False, seed=seed),
+    }
+    if packing:
+        train_sequences, padding = pack_sequences(train_sequences, max_length, pad_token_id)
+        validation_sequences, _ = pack_sequences(validation_sequences, max_length, pad_token_id)
+        report["padding_ratio"] = padding / (len(train_sequences) * max_length) if train_sequences else 0.0
+    else:
+        report["padding_ratio"] = padding_ratio(lengths, batch_size, bucketed=True, seed=seed)
+    report["train_sequences"] = len(train_sequences)
+
+    train = TokenizedDataset.from_sequences(train_sequences)
+    validation = TokenizedDataset.from_sequences(validation_sequences)
+    os.makedirs(directory, exist_ok=True)
+    train.save(os.path.join(directory, "train.npz"))
+    validation.save(os.path.join(directory, "validation.npz"))
+    with open(report_path, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=4)
+    report["cached"] = False
+    logging.info(
+        f"Tokenized {tokens} tokens in {tokenize_seconds:.2f}s ({report['tokenize_tokens_per_second']:.0f} tokens/s); "
+        f"padding ratio {report['padding_ratio']:.1%} vs {report['unbucketed_padding_ratio']:.1%} unbucketed"
+    )
+    return PreparedData(train, validation, report)